@@ -17,38 +17,69 @@ REFRESH_TOKEN_EXPIRE_DAYS = 7
 security = HTTPBearer(auto_error=False)
 
 
-def create_access_token(user_id: UUID) -> str:
-    """Create a new access token for the user."""
-    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+def create_access_token(user_id: UUID, now: Optional[datetime] = None) -> str:
+    """
+    Create a new access token for the user.
+
+    `now` overrides the issue time (defaults to the current UTC time).
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     payload = {
         "sub": str(user_id),
         "exp": expire,
         "type": "access",
-        "iat": datetime.now(timezone.utc)
+        "iat": now
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
-def create_refresh_token(user_id: UUID) -> str:
-    """Create a new refresh token for the user."""
-    expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+def create_refresh_token(user_id: UUID, now: Optional[datetime] = None) -> str:
+    """
+    Create a new refresh token for the user.
+
+    `now` overrides the issue time (defaults to the current UTC time).
+    """
+    if now is None:
+        now = datetime.now(timezone.utc)
+    expire = now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
     payload = {
         "sub": str(user_id),
         "exp": expire,
         "type": "refresh",
-        "iat": datetime.now(timezone.utc)
+        "iat": now
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
-def verify_token(token: str, expected_type: str = "access") -> UUID:
+def verify_token(
+    token: str,
+    expected_type: str = "access",
+    now: Optional[datetime] = None
+) -> UUID:
     """
     Verify a JWT token and return the user ID.
 
+    `now` overrides the time used for the expiration check (defaults to the
+    current UTC time).
+
     Raises HTTPException if token is invalid or expired.
     """
     try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        if now is None:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        else:
+            # Check expiry against the supplied time instead of the wall clock
+            payload = jwt.decode(
+                token,
+                JWT_SECRET,
+                algorithms=[JWT_ALGORITHM],
+                options={"verify_exp": False, "verify_iat": False}
+            )
+            exp = payload.get("exp")
+            if exp is not None and exp <= now.timestamp():
+                raise jwt.ExpiredSignatureError("Signature has expired")
 
         if payload.get("type") != expected_type:
             raise HTTPException(
@@ -1,12 +1,17 @@
 """3-stage multi-model deliberation orchestration."""
 
 import re
+from functools import lru_cache
 from collections import defaultdict
 from typing import List, Dict, Any, Tuple, Optional
 
 from .openrouter import query_models_parallel, query_model
 from .config import DEFAULT_MODELS, DEFAULT_LEAD_MODEL
 
+# Ranking patterns, compiled once at import (parse_ranking_from_text runs per Stage 2 result)
+_NUMBERED_RESPONSE_RE = re.compile(r'\d+\.\s*(Response [A-Z])')
+_RESPONSE_RE = re.compile(r'Response [A-Z]')
+
 
 async def stage1_collect_responses(
     user_query: str,
@@ -213,6 +218,16 @@ def parse_ranking_from_text(ranking_text: str) -> List[str]:
     Returns:
         List of response labels in ranked order
     """
+    if not ranking_text:
+        return []
+
+    # Copy out of the cache so callers can't mutate a cached result
+    return list(_parse_ranking_cached(ranking_text))
+
+
+@lru_cache(maxsize=256)
+def _parse_ranking_cached(ranking_text: str) -> Tuple[str, ...]:
+    """Cached parser behind parse_ranking_from_text (tuples keep entries immutable)."""
     # Look for "FINAL RANKING:" section
     if "FINAL RANKING:" in ranking_text:
         # Extract everything after "FINAL RANKING:"
@@ -221,18 +236,16 @@ def parse_ranking_from_text(ranking_text: str) -> List[str]:
             ranking_section = parts[1]
             # Try to extract numbered list format (e.g., "1. Response A")
             # This pattern looks for: number, period, optional space, "Response X"
-            numbered_matches = re.findall(r'\d+\.\s*Response [A-Z]', ranking_section)
+            # The capture group yields just the "Response X" part
+            numbered_matches = _NUMBERED_RESPONSE_RE.findall(ranking_section)
             if numbered_matches:
-                # Extract just the "Response X" part
-                return [re.search(r'Response [A-Z]', m).group() for m in numbered_matches]
+                return tuple(numbered_matches)
 
             # Fallback: Extract all "Response X" patterns in order
-            matches = re.findall(r'Response [A-Z]', ranking_section)
-            return matches
+            return tuple(_RESPONSE_RE.findall(ranking_section))
 
     # Fallback: try to find any "Response X" patterns in order
-    matches = re.findall(r'Response [A-Z]', ranking_text)
-    return matches
+    return tuple(_RESPONSE_RE.findall(ranking_text))
 
 
 def calculate_aggregate_rankings(
@@ -249,35 +262,33 @@ def calculate_aggregate_rankings(
     Returns:
         List of dicts with model name and average rank, sorted best to worst
     """
-    # Track positions for each model
-    model_positions = defaultdict(list)
+    # Track [sum of positions, count] for each model
+    model_totals = defaultdict(lambda: [0, 0])
 
     for ranking in stage2_results:
-        ranking_text = ranking['ranking']
-
         # Parse the ranking from the structured format
-        parsed_ranking = parse_ranking_from_text(ranking_text)
+        parsed_ranking = parse_ranking_from_text(ranking['ranking'])
 
         for position, label in enumerate(parsed_ranking, start=1):
-            if label in label_to_model:
-                model_name = label_to_model[label]
-                model_positions[model_name].append(position)
-
-    # Calculate average position for each model
-    aggregate = []
-    for model, positions in model_positions.items():
-        if positions:
-            avg_rank = sum(positions) / len(positions)
-            aggregate.append({
+            model_name = label_to_model.get(label)
+            if model_name is None:
+                continue
+            totals = model_totals[model_name]
+            totals[0] += position
+            totals[1] += 1
+
+    # Average position for each model, sorted by average rank (lower is better)
+    return sorted(
+        (
+            {
                 "model": model,
-                "average_rank": round(avg_rank, 2),
-                "rankings_count": len(positions)
-            })
-
-    # Sort by average rank (lower is better)
-    aggregate.sort(key=lambda x: x['average_rank'])
-
-    return aggregate
+                "average_rank": round(total / count, 2),
+                "rankings_count": count
+            }
+            for model, (total, count) in model_totals.items()
+        ),
+        key=lambda x: x['average_rank']
+    )
 
 
 async def generate_conversation_title(
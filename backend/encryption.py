@@ -6,34 +6,111 @@ Uses MultiFernet for key rotation support:
 - Older keys are retained for decrypting existing data
 - Enables zero-downtime key rotation
  - Optional API_KEY_ENCRYPTION_KEY_VERSION for monotonic version tracking
+
+Ciphertexts are stored as "v2:<key id>:<fernet token>", where the key id is a
+short non-secret fingerprint of the encrypting key, so decryption goes straight
+to the right key. Legacy tokens without the prefix are still decrypted by
+trying each key in turn.
 """
 
+import hashlib
+from functools import lru_cache
+from typing import Iterable, Optional
+
 from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 
 from .config import API_KEY_ENCRYPTION_KEYS, API_KEY_ENCRYPTION_KEY_VERSION
 
+# Prefix marking ciphertexts that carry a key id
+TOKEN_FORMAT_PREFIX = "v2"
+_TOKEN_FORMAT_PREFIX_BYTES = TOKEN_FORMAT_PREFIX.encode("ascii")
+
+
+def _get_keys() -> tuple[str, ...]:
+    """Get the configured encryption keys, newest first.
+
+    All key reads go through here; the tuple doubles as the cache key for
+    the Fernet builders below.
+    """
+    return tuple(API_KEY_ENCRYPTION_KEYS)
+
 
-def _get_fernets() -> list[Fernet]:
-    """Build Fernet instances for all configured keys."""
-    if not API_KEY_ENCRYPTION_KEYS:
+def _key_id(key: str) -> str:
+    """Derive a short, non-secret identifier for an encryption key."""
+    return hashlib.sha256(b"quinthesis-key-id:" + key.encode("utf-8")).hexdigest()[:8]
+
+
+@lru_cache(maxsize=4)
+def _build_fernets(keys: tuple[str, ...]) -> tuple[Fernet, ...]:
+    """Build Fernet instances for the given keys.
+
+    Cached per key tuple, so a changed key list gets fresh instances.
+    """
+    if not keys:
         raise ValueError(
             "API_KEY_ENCRYPTION_KEY not configured. "
             "Generate one with: python -c \"from cryptography.fernet import Fernet; print(Fernet.generate_key().decode())\""
         )
 
     fernets = []
-    for i, key in enumerate(API_KEY_ENCRYPTION_KEYS):
+    for i, key in enumerate(keys):
         try:
             fernets.append(Fernet(key.encode("utf-8")))
         except Exception as e:
             raise ValueError(f"Invalid Fernet key at position {i}: {e}")
 
-    return fernets
+    return tuple(fernets)
+
+
+@lru_cache(maxsize=4)
+def _get_multifernet(keys: tuple[str, ...]) -> MultiFernet:
+    """Build a MultiFernet for the given keys (cached per key tuple)."""
+    return MultiFernet(_build_fernets(keys))
+
 
+@lru_cache(maxsize=4)
+def _build_keyring(keys: tuple[str, ...]) -> dict[str, Fernet]:
+    """Map key id -> Fernet for the given keys, newest first (cached per key tuple)."""
+    return {_key_id(key): fernet for key, fernet in zip(keys, _build_fernets(keys))}
 
-def _get_primary_fernet() -> Fernet:
-    """Get the primary (newest) Fernet instance for encryption."""
-    return _get_fernets()[0]
+
+def _get_keyring() -> dict[str, Fernet]:
+    """Get the key id -> Fernet mapping for all configured keys."""
+    return _build_keyring(_get_keys())
+
+
+@lru_cache(maxsize=4)
+def _build_current_prefix(keys: tuple[str, ...]) -> str:
+    """Ciphertext prefix for tokens under the primary key (cached per key tuple)."""
+    return f"{TOKEN_FORMAT_PREFIX}:{next(iter(_build_keyring(keys)))}:"
+
+
+def _get_primary() -> tuple[str, Fernet]:
+    """Get the key id and Fernet instance of the primary (newest) key."""
+    return next(iter(_get_keyring().items()))
+
+
+def _split_token(encrypted_key: str) -> tuple[Optional[str], str]:
+    """Split a stored ciphertext into (key id, Fernet token).
+
+    The key id is None for legacy tokens stored without a prefix.
+    """
+    prefix, sep, rest = encrypted_key.partition(":")
+    if sep and prefix == TOKEN_FORMAT_PREFIX:
+        key_id, sep, token = rest.partition(":")
+        if sep:
+            return key_id, token
+    return None, encrypted_key
+
+
+def _split_token_bytes(encrypted_key: bytes) -> tuple[Optional[str], bytes]:
+    """Bytes counterpart of _split_token."""
+    prefix, sep, rest = encrypted_key.partition(b":")
+    if sep and prefix == _TOKEN_FORMAT_PREFIX_BYTES:
+        key_id, sep, token = rest.partition(b":")
+        if sep:
+            return key_id.decode("ascii", "replace"), token
+    return None, encrypted_key
 
 
 def _get_fernet() -> MultiFernet:
@@ -42,29 +119,60 @@ def _get_fernet() -> MultiFernet:
     Returns MultiFernet configured with all available keys.
     The first key is used for encryption, all keys are tried for decryption.
     """
-    return MultiFernet(_get_fernets())
+    return _get_multifernet(_get_keys())
+
+
+def encrypt_api_key_bytes(api_key: bytes) -> bytes:
+    """Encrypt raw API key bytes for storage.
+
+    Uses the first (newest) key in the rotation list and prefixes the
+    token with that key's id. The result is ASCII.
+    """
+    key_id, fernet = _get_primary()
+    prefix = f"{TOKEN_FORMAT_PREFIX}:{key_id}:".encode("ascii")
+    return prefix + fernet.encrypt(api_key)
+
+
+def decrypt_api_key_bytes(encrypted_key: bytes) -> bytes:
+    """Decrypt raw API key bytes from storage.
+
+    Prefixed tokens are decrypted with the key their id names. Legacy
+    tokens try all keys in the rotation list until one succeeds, so old
+    data encrypted with previous keys can still be decrypted.
+    """
+    keyring = _get_keyring()
+    key_id, token = _split_token_bytes(encrypted_key)
+    if key_id is None:
+        fernet = _get_fernet()
+    else:
+        fernet = keyring.get(key_id)
+        if fernet is None:
+            raise ValueError("Failed to decrypt API key - invalid token or key")
+    try:
+        return fernet.decrypt(token)
+    except InvalidToken:
+        raise ValueError("Failed to decrypt API key - invalid token or key")
 
 
 def encrypt_api_key(api_key: str) -> str:
     """Encrypt an API key for storage.
 
-    Uses the first (newest) key in the rotation list.
+    String wrapper around encrypt_api_key_bytes.
     """
-    fernet = _get_fernet()
-    return fernet.encrypt(api_key.encode("utf-8")).decode("utf-8")
+    return encrypt_api_key_bytes(api_key.encode("utf-8")).decode("ascii")
 
 
 def decrypt_api_key(encrypted_key: str) -> str:
     """Decrypt an API key from storage.
 
-    Tries all keys in the rotation list until one succeeds.
-    This allows old data encrypted with previous keys to still be decrypted.
+    String wrapper around decrypt_api_key_bytes.
     """
-    fernet = _get_fernet()
     try:
-        return fernet.decrypt(encrypted_key.encode("utf-8")).decode("utf-8")
-    except InvalidToken:
+        raw = encrypted_key.encode("ascii")
+    except UnicodeEncodeError:
+        # Ciphertexts are always ASCII
         raise ValueError("Failed to decrypt API key - invalid token or key")
+    return decrypt_api_key_bytes(raw).decode("utf-8")
 
 
 def rotate_api_key(encrypted_key: str) -> tuple[str, bool]:
@@ -78,21 +186,50 @@ def rotate_api_key(encrypted_key: str) -> tuple[str, bool]:
     This is useful for lazy re-encryption: when a user accesses their key,
     we can transparently upgrade it to the newest encryption key.
     """
-    primary = _get_primary_fernet()
-    try:
-        # If primary key can decrypt, no rotation needed
-        primary.decrypt(encrypted_key.encode("utf-8"))
+    # Prefixed token already under the primary key: a string compare is
+    # enough, no base64 decode or HMAC check
+    if encrypted_key.startswith(_build_current_prefix(_get_keys())):
         return encrypted_key, False
-    except InvalidToken:
-        pass
 
-    fernet = _get_fernet()
+    _, primary = _get_primary()
+    key_id, token = _split_token(encrypted_key)
+
+    if key_id is None:
+        try:
+            # If primary key can decrypt a legacy token, no rotation needed
+            primary.decrypt(token.encode("utf-8"))
+            return encrypted_key, False
+        except InvalidToken:
+            pass
+
     try:
-        decrypted = fernet.decrypt(encrypted_key.encode("utf-8"))
-        new_encrypted = primary.encrypt(decrypted).decode("utf-8")
-        return new_encrypted, True
-    except InvalidToken:
+        decrypted = decrypt_api_key(encrypted_key)
+    except ValueError:
         raise ValueError("Failed to rotate API key - invalid token or key")
+    return encrypt_api_key(decrypted), True
+
+
+def encrypt_api_keys(api_keys: Iterable[str]) -> list[str]:
+    """Encrypt several API keys for storage.
+
+    Same output format as encrypt_api_key, with the primary key looked up
+    once for the whole batch.
+    """
+    key_id, fernet = _get_primary()
+    prefix = f"{TOKEN_FORMAT_PREFIX}:{key_id}:"
+    return [
+        prefix + fernet.encrypt(api_key.encode("utf-8")).decode("utf-8")
+        for api_key in api_keys
+    ]
+
+
+def rotate_api_keys(encrypted_keys: Iterable[str]) -> list[tuple[str, bool]]:
+    """Rotate several stored API keys, e.g. from a migration script.
+
+    Returns one (new_encrypted_key, was_rotated) tuple per input, in order.
+    Raises ValueError if any key cannot be decrypted.
+    """
+    return [rotate_api_key(encrypted_key) for encrypted_key in encrypted_keys]
 
 
 def get_key_hint(api_key: str) -> str:
@@ -100,9 +237,15 @@ def get_key_hint(api_key: str) -> str:
 
     Shows the last 6 characters for user identification.
     """
-    if len(api_key) > 6:
-        return f"...{api_key[-6:]}"
-    return api_key
+    return api_key if len(api_key) <= 6 else f"...{api_key[-6:]}"
+
+
+def get_key_hints(api_keys: Iterable[str]) -> list[str]:
+    """Get display hints for several API keys at once.
+
+    Same output as calling get_key_hint on each key.
+    """
+    return [get_key_hint(k) for k in api_keys]
 
 
 def get_key_count() -> int:
@@ -110,7 +253,7 @@ def get_key_count() -> int:
 
     Useful for diagnostics and rotation status checks.
     """
-    return len(API_KEY_ENCRYPTION_KEYS)
+    return len(_get_keys())
 
 
 def get_current_key_version() -> int:
@@ -121,4 +264,4 @@ def get_current_key_version() -> int:
     """
     if API_KEY_ENCRYPTION_KEY_VERSION is not None:
         return API_KEY_ENCRYPTION_KEY_VERSION
-    return len(API_KEY_ENCRYPTION_KEYS)
+    return len(_get_keys())
@@ -8,11 +8,14 @@ single-instance deployments. For multi-instance deployments (auto-scaling),
 replace with Redis or another shared state store.
 """
 
+import os
 import secrets
 import hashlib
 import base64
-import asyncio
-from datetime import datetime, timedelta, timezone
+import heapq
+import threading
+import time
+from datetime import datetime, timezone
 from dataclasses import dataclass
 from typing import Optional
 
@@ -20,30 +23,85 @@ from typing import Optional
 # State expiration time (10 minutes)
 STATE_TTL_SECONDS = 600
 
+# Size of each read from the OS random source, in 32-byte draws (an OAuth
+# state takes two: one for the state token, one for the code verifier)
+ENTROPY_BATCH_SIZE = 64
 
-@dataclass
+
+@dataclass(slots=True)
 class OAuthStateData:
     """Data associated with an OAuth state token."""
-    created_at: datetime
+    created_at: datetime  # Wall-clock creation time, for logging only
     code_verifier: str  # PKCE code verifier
+    created_at_mono: float  # time.monotonic() at creation, used for expiry
 
 
 # In-memory store for OAuth states
 # WARNING: Only works with single-instance deployments
 # For multi-instance deployments, replace with Redis
+#
+# No lock is needed: all access happens on the event loop thread, and no
+# operation on the store awaits part-way through, so each one is atomic.
 _oauth_states: dict[str, OAuthStateData] = {}
 
-# Lock for thread-safe access to _oauth_states
-_state_lock = asyncio.Lock()
+# Bound once for the PKCE challenge hot path
+_sha256 = hashlib.sha256
+_b64encode = base64.urlsafe_b64encode
+
+# Min-heap of (expires_at, state) on the monotonic clock so cleanup only
+# visits expired entries
+_expiry_heap: list[tuple[float, str]] = []
+
+# Random bytes read ahead for state tokens and code verifiers
+_entropy_pool = bytearray()
+_pool_lock = threading.Lock()
+
+# A forked child must never hand out the same bytes as its parent
+# (register_at_fork doesn't exist on Windows, which has no fork either)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_entropy_pool.clear)
+
+
+def _now() -> datetime:
+    """Current UTC time (recorded on states for logging)."""
+    return datetime.now(timezone.utc)
+
+
+def _monotonic() -> float:
+    """Current monotonic time (single seam for state expiry)."""
+    return time.monotonic()
+
 
+def _get_random_bytes(n: int = 32) -> bytes:
+    """Take n random bytes from the pool, refilling it in one batch."""
+    with _pool_lock:
+        if len(_entropy_pool) < n:
+            # Read at least a full batch, and always enough to cover n
+            _entropy_pool.extend(
+                secrets.token_bytes(max(n - len(_entropy_pool), 32 * ENTROPY_BATCH_SIZE))
+            )
+        chunk = bytes(_entropy_pool[:n])
+        del _entropy_pool[:n]
+    return chunk
 
-def _generate_code_verifier() -> str:
+
+def _encode_token(raw: bytes) -> str:
+    """Base64url encode without padding."""
+    return _b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _generate_code_verifier(raw: Optional[bytes] = None) -> str:
     """Generate a cryptographically random PKCE code verifier.
 
+    Args:
+        raw: Optional 32 pre-drawn random bytes to encode
+
     Returns a 43-128 character URL-safe string as per RFC 7636.
     """
+    if raw is None:
+        raw = _get_random_bytes(32)
     # 32 bytes = 43 characters when base64url encoded
-    return secrets.token_urlsafe(32)
+    return _encode_token(raw)
 
 
 def _generate_code_challenge(verifier: str) -> str:
@@ -55,22 +113,22 @@ def _generate_code_challenge(verifier: str) -> str:
     Returns:
         Base64url-encoded SHA256 hash of the verifier
     """
-    digest = hashlib.sha256(verifier.encode('ascii')).digest()
-    # Base64url encode without padding
-    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+    digest = _sha256(verifier.encode('ascii')).digest()
+    # Base64url encode without padding: a 32-byte digest always encodes to
+    # 44 characters ending in exactly one '='
+    return _b64encode(digest)[:-1].decode('ascii')
+
 
+def _cleanup_expired_states(now: float) -> None:
+    """Remove state tokens whose TTL has passed.
 
-def _cleanup_expired_states_sync() -> None:
-    """Remove expired state tokens from storage (must be called with lock held)."""
-    now = datetime.now(timezone.utc)
-    cutoff = now - timedelta(seconds=STATE_TTL_SECONDS)
-    # Build list of expired keys first to avoid modifying dict during iteration
-    expired = [
-        state for state, data in _oauth_states.items()
-        if data.created_at < cutoff
-    ]
-    for state in expired:
-        del _oauth_states[state]
+    Pops entries off the expiry heap, so the work is proportional to the
+    number of expired states rather than the number of live ones.
+    """
+    while _expiry_heap and _expiry_heap[0][0] < now:
+        _, state = heapq.heappop(_expiry_heap)
+        # Already consumed states are simply absent
+        _oauth_states.pop(state, None)
 
 
 async def create_oauth_state() -> tuple[str, str]:
@@ -81,21 +139,24 @@ async def create_oauth_state() -> tuple[str, str]:
         - state: Random token to be included in authorization URL
         - code_challenge: PKCE challenge to be included in authorization URL
     """
-    # Generate state token and PKCE values outside the lock
-    state = secrets.token_urlsafe(32)
-    code_verifier = _generate_code_verifier()
+    # Generate state token and PKCE values from a single 64-byte draw split
+    # into two independent 32-byte halves
+    raw = _get_random_bytes(64)
+    state = _encode_token(raw[:32])
+    code_verifier = _generate_code_verifier(raw[32:])
     code_challenge = _generate_code_challenge(code_verifier)
-    now = datetime.now(timezone.utc)
+    now = _monotonic()
 
-    async with _state_lock:
-        # Cleanup old states periodically
-        _cleanup_expired_states_sync()
+    # Cleanup old states periodically
+    _cleanup_expired_states(now)
 
-        # Store state with verifier
-        _oauth_states[state] = OAuthStateData(
-            created_at=now,
-            code_verifier=code_verifier
-        )
+    # Store state with verifier
+    _oauth_states[state] = OAuthStateData(
+        created_at=_now(),
+        code_verifier=code_verifier,
+        created_at_mono=now
+    )
+    heapq.heappush(_expiry_heap, (now + STATE_TTL_SECONDS, state))
 
     return state, code_challenge
 
@@ -113,16 +174,14 @@ async def validate_and_consume_state(state: str) -> Optional[str]:
     if not state:
         return None
 
-    async with _state_lock:
-        if state not in _oauth_states:
-            return None
+    # Popping consumes the state, so exactly one caller gets the entry
+    state_data = _oauth_states.pop(state, None)
 
-        state_data = _oauth_states.pop(state)
+    if state_data is None:
+        return None
 
-    # Check if expired (can be done outside lock)
-    now = datetime.now(timezone.utc)
-    age = (now - state_data.created_at).total_seconds()
-    if age > STATE_TTL_SECONDS:
+    # Check if expired
+    if _monotonic() - state_data.created_at_mono > STATE_TTL_SECONDS:
         return None
 
     return state_data.code_verifier
@@ -8,16 +8,24 @@ single-instance deployments. For multi-instance deployments (auto-scaling),
 replace with Redis or another shared state store.
 """
 
-import asyncio
+import heapq
 import logging
-from collections import defaultdict
-from datetime import datetime, timedelta, timezone
-from typing import Optional
+import time
+from bisect import bisect_right
+from collections import deque
+from typing import Callable
 from fastapi import HTTPException
 
 logger = logging.getLogger(__name__)
 
 
+# Maximum number of idle users evicted per check() call
+EVICTIONS_PER_CHECK = 8
+
+# Length of the sliding window in seconds
+WINDOW_SECONDS = 60.0
+
+
 class RateLimiter:
     """In-memory rate limiter using sliding window algorithm.
 
@@ -25,39 +33,47 @@ class RateLimiter:
 
     Attributes:
         requests_per_minute: Maximum requests allowed per minute per user
-        cleanup_interval: How often to clean up old entries (in seconds)
     """
 
-    def __init__(self, requests_per_minute: int = 30, cleanup_interval: int = 60):
+    def __init__(
+        self,
+        requests_per_minute: int = 30,
+        clock: Callable[[], float] = time.monotonic
+    ):
         self.requests_per_minute = requests_per_minute
-        self.cleanup_interval = cleanup_interval
-        self._requests: dict[str, list[datetime]] = defaultdict(list)
-        self._lock = asyncio.Lock()
-        self._last_cleanup = datetime.now(timezone.utc)
-
-    async def _cleanup_old_entries(self) -> None:
-        """Remove expired entries from all users (must be called with lock held)."""
-        now = datetime.now(timezone.utc)
-
-        # Only cleanup periodically to avoid overhead
-        if (now - self._last_cleanup).total_seconds() < self.cleanup_interval:
-            return
-
-        cutoff = now - timedelta(minutes=1)
-        users_to_remove = []
-
-        for user_id, timestamps in self._requests.items():
-            # Filter to only recent timestamps
-            self._requests[user_id] = [ts for ts in timestamps if ts > cutoff]
-            # Mark empty users for removal
-            if not self._requests[user_id]:
-                users_to_remove.append(user_id)
-
-        # Remove users with no recent requests
-        for user_id in users_to_remove:
-            del self._requests[user_id]
-
-        self._last_cleanup = now
+        # Source of timestamps in seconds; injectable for tests
+        self._clock = clock
+        # Per-user ring of the last `requests_per_minute` timestamps, oldest
+        # first; appending to a full ring drops its oldest entry
+        self._requests: dict[str, deque[float]] = {}
+        # Min-heap of (idle_at, user_id): when a user's window may be empty
+        self._evict_heap: list[tuple[float, str]] = []
+        # No lock: check() and get_remaining() never await, so the event loop
+        # can't interleave two calls mid-update
+
+    def _evict_idle_users(self, now: float) -> None:
+        """Drop a bounded number of users with no requests in the last minute.
+
+        Work per call is capped at
+        EVICTIONS_PER_CHECK, spreading cleanup across requests instead of
+        sweeping every user at once.
+        """
+        cutoff = now - WINDOW_SECONDS
+        for _ in range(EVICTIONS_PER_CHECK):
+            if not self._evict_heap or self._evict_heap[0][0] > now:
+                return
+            _, user_id = heapq.heappop(self._evict_heap)
+            timestamps = self._requests.get(user_id)
+            if timestamps is None:
+                continue
+            # An empty ring (limit of 0) never has recent requests
+            if not timestamps or timestamps[-1] <= cutoff:
+                del self._requests[user_id]
+            else:
+                # Still active: check again once the newest request ages out
+                heapq.heappush(
+                    self._evict_heap, (timestamps[-1] + WINDOW_SECONDS, user_id)
+                )
 
     async def check(self, user_id: str) -> None:
         """Check if user has exceeded rate limit.
@@ -68,30 +84,33 @@ class RateLimiter:
         Raises:
             HTTPException: 429 Too Many Requests if limit exceeded
         """
-        now = datetime.now(timezone.utc)
-        cutoff = now - timedelta(minutes=1)
-
-        async with self._lock:
-            # Cleanup periodically
-            await self._cleanup_old_entries()
-
-            # Get user's recent requests
-            user_requests = self._requests[user_id]
-
-            # Filter to only requests in the last minute
-            recent_requests = [ts for ts in user_requests if ts > cutoff]
-            self._requests[user_id] = recent_requests
-
-            # Check limit
-            if len(recent_requests) >= self.requests_per_minute:
-                logger.warning(f"Rate limit exceeded for user {user_id}")
-                raise HTTPException(
-                    status_code=429,
-                    detail=f"Rate limit exceeded. Maximum {self.requests_per_minute} requests per minute."
-                )
-
-            # Record this request
-            self._requests[user_id].append(now)
+        now = self._clock()
+        cutoff = now - WINDOW_SECONDS
+
+        # Incrementally evict idle users
+        self._evict_idle_users(now)
+
+        user_requests = self._requests.get(user_id)
+        if user_requests is None:
+            user_requests = deque(maxlen=self.requests_per_minute)
+            self._requests[user_id] = user_requests
+            heapq.heappush(self._evict_heap, (now + WINDOW_SECONDS, user_id))
+
+        # Check limit: a full ring whose oldest entry is still inside
+        # the window means the last minute already has the maximum (a
+        # limit of 0 gives a ring that is always full and always empty)
+        if (
+            len(user_requests) == self.requests_per_minute
+            and (not user_requests or user_requests[0] > cutoff)
+        ):
+            logger.warning(f"Rate limit exceeded for user {user_id}")
+            raise HTTPException(
+                status_code=429,
+                detail=f"Rate limit exceeded. Maximum {self.requests_per_minute} requests per minute."
+            )
+
+        # Record this request
+        user_requests.append(now)
 
     async def get_remaining(self, user_id: str) -> int:
         """Get remaining requests for user in current window.
@@ -102,13 +121,15 @@ class RateLimiter:
         Returns:
             Number of requests remaining before rate limit
         """
-        now = datetime.now(timezone.utc)
-        cutoff = now - timedelta(minutes=1)
-
-        async with self._lock:
-            user_requests = self._requests.get(user_id, [])
-            recent_count = sum(1 for ts in user_requests if ts > cutoff)
-            return max(0, self.requests_per_minute - recent_count)
+        now = self._clock()
+        cutoff = now - WINDOW_SECONDS
+
+        user_requests = self._requests.get(user_id)
+        if not user_requests:
+            return self.requests_per_minute
+        # Timestamps are sorted, so everything after cutoff's insertion point is recent
+        recent_count = len(user_requests) - bisect_right(user_requests, cutoff)
+        return max(0, self.requests_per_minute - recent_count)
 
 
 # Global rate limiter instances
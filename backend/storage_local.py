@@ -1,10 +1,15 @@
 """Local JSON-based storage for development without a database."""
 
+import copy
 import json
 import os
+from contextlib import asynccontextmanager
+from collections import OrderedDict
+from contextvars import ContextVar
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from uuid import UUID, uuid4
+from . import encryption as _encryption
 from .config import DEFAULT_MODELS, DEFAULT_LEAD_MODEL
 from pathlib import Path
 
@@ -14,6 +19,192 @@ USERS_DIR = Path("data/users")
 API_KEYS_DIR = Path("data/api_keys")
 
 
+# ============== Persistence ==============
+# All file access goes through these helpers, so the on-disk format lives in
+# one place and tests can swap the raw file helpers for an in-memory double.
+
+# Maximum number of parsed documents kept in _doc_cache
+DOC_CACHE_SIZE = 256
+
+# Parsed JSON documents, least recently used first: path -> (mtime_ns, size,
+# data). An entry is only used while the file's mtime and size still match,
+# so edits made outside this process are picked up on the next read.
+_doc_cache: "OrderedDict[Path, Tuple[int, int, Any]]" = OrderedDict()
+
+
+def _cache_doc(path: Path, stat: os.stat_result, data: Any) -> None:
+    """Remember a parsed document, evicting the least recently used."""
+    _doc_cache[path] = (stat.st_mtime_ns, stat.st_size, data)
+    _doc_cache.move_to_end(path)
+    if len(_doc_cache) > DOC_CACHE_SIZE:
+        _doc_cache.popitem(last=False)
+
+
+def _read_file(path: Path, shared: bool = False) -> Optional[Any]:
+    """Load a JSON file, or return None if it doesn't exist.
+
+    Unchanged files are served from _doc_cache. Callers get their own copy,
+    since they mutate documents before writing them back. Pass shared=True
+    to get the cached object itself, either to only read it or to update it
+    in place and write it straight back (large indexes are cheaper to update
+    that way than to copy).
+    """
+    try:
+        stat = os.stat(path)
+        cached = _doc_cache.get(path)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            _doc_cache.move_to_end(path)
+            data = cached[2]
+        else:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            _cache_doc(path, stat, data)
+    except FileNotFoundError:
+        _doc_cache.pop(path, None)
+        return None
+    return data if shared else copy.deepcopy(data)
+
+
+def _write_file(path: Path, data: Any) -> None:
+    """Write data to a JSON file, replacing any existing contents.
+
+    Index files (names starting with "_") are rewritten often and only read
+    by code, so they are written compactly; other documents are indented.
+    """
+    # Drop the cached copy first: data may be that very object, updated in place
+    _doc_cache.pop(path, None)
+    with open(path, 'w') as f:
+        if path.name.startswith("_"):
+            json.dump(data, f, separators=(",", ":"))
+        else:
+            json.dump(data, f, indent=2)
+
+
+def _delete_file(path: Path) -> bool:
+    """Delete a JSON file. Returns False if it didn't exist."""
+    _doc_cache.pop(path, None)
+    try:
+        path.unlink()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def _list_files(directory: Path, pattern: str = "*.json") -> List[Path]:
+    """List the files matching pattern in a directory, most recently written first."""
+    return sorted(directory.glob(pattern), key=lambda p: p.stat().st_mtime, reverse=True)
+
+
+def _read_log_file(path: Path) -> List[Any]:
+    """Load the records of a JSON Lines log, or [] if it doesn't exist."""
+    try:
+        with open(path, 'r') as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def _append_log_file(path: Path, records: List[Any]) -> None:
+    """Append records to a JSON Lines log, one per line.
+
+    Appends cost O(records) however long the log is, so they are written
+    straight away rather than deferred by batch().
+    """
+    with open(path, 'a') as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+
+
+# Writes deferred by an active batch(): path -> data, or _DELETED
+_pending_writes: ContextVar[Optional[Dict[Path, Any]]] = ContextVar(
+    "_pending_writes", default=None
+)
+_DELETED = object()
+
+
+@asynccontextmanager
+async def batch():
+    """Defer file writes until the block exits, then write each file once.
+
+    Reads inside the block see the pending writes. A nested batch joins the
+    outer one. Pending writes are flushed even if the block raises, matching
+    what unbatched calls would have written.
+
+    Usage:
+        async with storage_local.batch():
+            for conv_id in ids:
+                await storage_local.create_conversation(conv_id)
+    """
+    if _pending_writes.get() is not None:
+        yield
+        return
+
+    pending: Dict[Path, Any] = {}
+    token = _pending_writes.set(pending)
+    try:
+        yield
+    finally:
+        _pending_writes.reset(token)
+        for path, data in pending.items():
+            if data is _DELETED:
+                _delete_file(path)
+            else:
+                _write_file(path, data)
+
+
+def _read_json(path: Path, shared: bool = False) -> Optional[Any]:
+    """Load a stored document, or return None if it doesn't exist.
+
+    See _read_file for shared.
+    """
+    pending = _pending_writes.get()
+    if pending is None:
+        return _read_file(path, shared)
+    if path in pending:
+        data = pending[path]
+        if data is _DELETED:
+            return None
+        return data if shared else copy.deepcopy(data)
+    # Copy-on-write inside a batch: a shared read may be updated in place,
+    # and the cached object must not show changes that aren't on disk yet
+    return _read_file(path)
+
+
+def _write_json(path: Path, data: Any) -> None:
+    """Store a document, deferring the write inside a batch()."""
+    pending = _pending_writes.get()
+    if pending is None:
+        _write_file(path, data)
+        return
+    # Already pending when a shared read was updated in place
+    owned = pending.pop(path, None) is data
+    # Re-insert so pending order follows write order
+    pending[path] = data if owned else copy.deepcopy(data)
+
+
+def _delete_json(path: Path) -> bool:
+    """Delete a stored document. Returns False if it didn't exist."""
+    pending = _pending_writes.get()
+    if pending is None:
+        return _delete_file(path)
+    existed = _read_json(path) is not None
+    pending.pop(path, None)
+    pending[path] = _DELETED
+    return existed
+
+
+def _list_json(directory: Path) -> List[Path]:
+    """List the stored documents in a directory, most recently written first."""
+    paths = _list_files(directory)
+    pending = _pending_writes.get()
+    if not pending:
+        return paths
+    recent = [
+        path for path in reversed(pending)
+        if path.parent == directory and pending[path] is not _DELETED
+    ]
+    return recent + [path for path in paths if path not in pending]
+
+
 def _ensure_data_dir():
     """Ensure the data directory exists."""
     DATA_DIR.mkdir(parents=True, exist_ok=True)
@@ -24,6 +215,68 @@ def _get_conversation_path(conversation_id: str) -> Path:
     return DATA_DIR / f"{conversation_id}.json"
 
 
+def _get_conversation_index_path() -> Path:
+    """Get the conversation index file path."""
+    return DATA_DIR / "_index.json"
+
+
+def _index_entry(conv: Dict[str, Any]) -> Dict[str, Any]:
+    """Summarize a conversation for the conversation index.
+
+    Only fields that rarely change are kept, so adding a message normally
+    leaves the index untouched.
+    """
+    return {
+        "user_id": conv.get("user_id"),
+        "has_messages": bool(conv.get("messages")),
+    }
+
+
+def _load_conversation_index(shared: bool = False) -> Dict[str, Dict[str, Any]]:
+    """Load the conversation_id -> summary index, oldest conversation first.
+
+    Listing filters on this one file instead of opening every conversation.
+    If it is missing (data from before the index existed), it is rebuilt
+    from the conversation files. Pass shared=True for lookups and for
+    updates that are saved right away.
+    """
+    _ensure_data_dir()
+    index = _read_json(_get_conversation_index_path(), shared)
+    if index is not None:
+        return index
+
+    convs = []
+    for path in _list_json(DATA_DIR):
+        if path.name.startswith("_"):
+            continue
+        try:
+            conv = _read_json(path, shared=True)
+            if conv is not None:
+                convs.append((conv["created_at"], conv["id"], _index_entry(conv)))
+        except (json.JSONDecodeError, KeyError):
+            continue
+    index = {conv_id: entry for _, conv_id, entry in sorted(convs)}
+    if index:
+        _save_conversation_index(index)
+    return index
+
+
+def _save_conversation_index(index: Dict[str, Dict[str, Any]]):
+    """Save the conversation index."""
+    _ensure_data_dir()
+    _write_json(_get_conversation_index_path(), index)
+
+
+def _save_conversation(conv: Dict[str, Any]):
+    """Write a conversation file, and its index entry if that changed."""
+    _write_json(_get_conversation_path(conv["id"]), conv)
+    entry = _index_entry(conv)
+    index = _load_conversation_index(shared=True)
+    if index.get(conv["id"]) != entry:
+        index[conv["id"]] = entry
+        _save_conversation_index(index)
+
+
 async def create_conversation(
     conversation_id: str,
     models: List[str] | None = None,
@@ -46,29 +299,36 @@ async def create_conversation(
         "messages": []
     }
 
-    with open(_get_conversation_path(conversation_id), 'w') as f:
-        json.dump(conversation, f, indent=2)
+    _save_conversation(conversation)
 
     return conversation
 
 
+async def bulk_create_conversations(specs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Create several conversations, writing the conversation index once.
+
+    Each spec holds create_conversation's keyword arguments, e.g.
+    {"conversation_id": "...", "user_id": ...}.
+    """
+    async with batch():
+        return [await create_conversation(**spec) for spec in specs]
+
+
 async def get_conversation(conversation_id: str, user_id: Optional[UUID] = None) -> Optional[Dict[str, Any]]:
     """Load a conversation from storage."""
-    path = _get_conversation_path(conversation_id)
+    conversation = _read_json(_get_conversation_path(conversation_id))
 
-    if not path.exists():
+    if conversation is None:
         return None
 
-    with open(path, 'r') as f:
-        conversation = json.load(f)
-        # Filter by user_id if provided
-        if user_id is not None:
-            conv_user_id = conversation.get("user_id")
-            if conv_user_id != str(user_id):
-                return None
-        conversation.setdefault("models", list(DEFAULT_MODELS))
-        conversation.setdefault("lead_model", DEFAULT_LEAD_MODEL)
-        return conversation
+    # Filter by user_id if provided
+    if user_id is not None:
+        conv_user_id = conversation.get("user_id")
+        if conv_user_id != str(user_id):
+            return None
+    conversation.setdefault("models", list(DEFAULT_MODELS))
+    conversation.setdefault("lead_model", DEFAULT_LEAD_MODEL)
+    return conversation
 
 
 async def list_conversations(user_id: Optional[UUID] = None) -> List[Dict[str, Any]]:
@@ -78,32 +338,24 @@ async def list_conversations(user_id: Optional[UUID] = None) -> List[Dict[str, A
     Filters out empty conversations (those with no messages) to prevent
     orphaned entries from appearing in the archive.
     """
-    _ensure_data_dir()
+    user_id_str = str(user_id) if user_id is not None else None
 
-    conversations = []
-    for path in sorted(DATA_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True):
-        try:
-            with open(path, 'r') as f:
-                conv = json.load(f)
-                # Filter by user_id if provided
-                if user_id is not None:
-                    conv_user_id = conv.get("user_id")
-                    if conv_user_id != str(user_id):
-                        continue
-                # Filter out empty conversations
-                message_count = len(conv.get("messages", []))
-                if message_count == 0:
-                    continue
-                conversations.append({
-                    "id": conv["id"],
-                    "created_at": conv["created_at"],
-                    "title": conv.get("title", "Untitled"),
-                    "message_count": message_count
-                })
-        except (json.JSONDecodeError, KeyError):
+    # Newest first, matching the PostgreSQL backend's ORDER BY created_at DESC
+    result = []
+    for conv_id, entry in reversed(_load_conversation_index(shared=True).items()):
+        # Filter by user_id if provided, and filter out empty conversations
+        if not entry["has_messages"] or (user_id_str is not None and entry["user_id"] != user_id_str):
             continue
-
-    return conversations
+        conv = _read_json(_get_conversation_path(conv_id), shared=True)
+        if conv is None:
+            continue
+        result.append({
+            "id": conv_id,
+            "created_at": conv["created_at"],
+            "title": conv.get("title", "Untitled"),
+            "message_count": len(conv["messages"])
+        })
+    return result
 
 
 async def add_user_message(conversation_id: str, content: str) -> int:
@@ -118,8 +370,7 @@ async def add_user_message(conversation_id: str, content: str) -> int:
         "content": content
     })
 
-    with open(_get_conversation_path(conversation_id), 'w') as f:
-        json.dump(conv, f, indent=2)
+    _save_conversation(conv)
 
     return message_order
 
@@ -142,8 +393,7 @@ async def add_assistant_message(
         "stage3": stage3
     })
 
-    with open(_get_conversation_path(conversation_id), 'w') as f:
-        json.dump(conv, f, indent=2)
+    _save_conversation(conv)
 
 
 async def update_conversation_title(conversation_id: str, title: str):
@@ -154,8 +404,7 @@ async def update_conversation_title(conversation_id: str, title: str):
 
     conv["title"] = title
 
-    with open(_get_conversation_path(conversation_id), 'w') as f:
-        json.dump(conv, f, indent=2)
+    _save_conversation(conv)
 
 
 async def delete_conversation(conversation_id: str, user_id: Optional[UUID] = None) -> bool:
@@ -170,19 +419,19 @@ async def delete_conversation(conversation_id: str, user_id: Optional[UUID] = No
         True if deleted, False if not found or not owned by user
     """
     path = _get_conversation_path(conversation_id)
+    conv = _read_json(path)
 
-    if not path.exists():
+    if conv is None:
         return False
 
     # Verify ownership if user_id provided
-    if user_id is not None:
-        with open(path, 'r') as f:
-            conv = json.load(f)
-            if conv.get("user_id") != str(user_id):
-                return False
+    if user_id is not None and conv.get("user_id") != str(user_id):
+        return False
 
-    path.unlink()
-    return True
+    index = _load_conversation_index(shared=True)
+    if index.pop(conversation_id, None) is not None:
+        _save_conversation_index(index)
+    return _delete_json(path)
 
 
 # ============== User Management ==============
@@ -207,21 +456,20 @@ def _get_user_by_email_path() -> Path:
     return USERS_DIR / "_email_index.json"
 
 
-def _load_email_index() -> Dict[str, str]:
-    """Load the email to user_id index."""
+def _load_email_index(shared: bool = False) -> Dict[str, str]:
+    """Load the lowercase email to user_id index.
+
+    Pass shared=True for lookups, and for updates that are saved right
+    away, which then skip copying the whole index.
+    """
     _ensure_users_dir()
-    index_path = _get_user_by_email_path()
-    if index_path.exists():
-        with open(index_path, 'r') as f:
-            return json.load(f)
-    return {}
+    return _read_json(_get_user_by_email_path(), shared) or {}
 
 
 def _save_email_index(index: Dict[str, str]):
     """Save the email to user_id index."""
     _ensure_users_dir()
-    with open(_get_user_by_email_path(), 'w') as f:
-        json.dump(index, f, indent=2)
+    _write_json(_get_user_by_email_path(), index)
 
 
 async def create_user(email: str, password_hash: str) -> Dict[str, Any]:
@@ -240,11 +488,10 @@ async def create_user(email: str, password_hash: str) -> Dict[str, Any]:
     }
 
     # Save user file
-    with open(_get_user_path(user_id), 'w') as f:
-        json.dump(user, f, indent=2)
+    _write_json(_get_user_path(user_id), user)
 
     # Update email index
-    index = _load_email_index()
+    index = _load_email_index(shared=True)
     index[email.lower()] = user_id
     _save_email_index(index)
 
@@ -253,8 +500,7 @@ async def create_user(email: str, password_hash: str) -> Dict[str, Any]:
 
 async def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
     """Get a user by email."""
-    index = _load_email_index()
-    user_id = index.get(email.lower())
+    user_id = _load_email_index(shared=True).get(email.lower())
 
     if not user_id:
         return None
@@ -264,13 +510,7 @@ async def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
 
 async def get_user_by_id(user_id: UUID) -> Optional[Dict[str, Any]]:
     """Get a user by ID."""
-    path = _get_user_path(str(user_id))
-
-    if not path.exists():
-        return None
-
-    with open(path, 'r') as f:
-        return json.load(f)
+    return _read_json(_get_user_path(str(user_id)))
 
 
 # ============== OAuth User Management ==============
@@ -280,21 +520,20 @@ def _get_oauth_index_path() -> Path:
     return USERS_DIR / "_oauth_index.json"
 
 
-def _load_oauth_index() -> Dict[str, str]:
-    """Load the OAuth provider:id to user_id index."""
+def _load_oauth_index(shared: bool = False) -> Dict[str, str]:
+    """Load the OAuth provider:id to user_id index.
+
+    Pass shared=True for lookups and immediately saved updates (see
+    _load_email_index).
+    """
     _ensure_users_dir()
-    index_path = _get_oauth_index_path()
-    if index_path.exists():
-        with open(index_path, 'r') as f:
-            return json.load(f)
-    return {}
+    return _read_json(_get_oauth_index_path(), shared) or {}
 
 
 def _save_oauth_index(index: Dict[str, str]):
     """Save the OAuth provider:id to user_id index."""
     _ensure_users_dir()
-    with open(_get_oauth_index_path(), 'w') as f:
-        json.dump(index, f, indent=2)
+    _write_json(_get_oauth_index_path(), index)
 
 
 async def create_oauth_user(
@@ -323,16 +562,15 @@ async def create_oauth_user(
     }
 
     # Save user file
-    with open(_get_user_path(user_id), 'w') as f:
-        json.dump(user, f, indent=2)
+    _write_json(_get_user_path(user_id), user)
 
     # Update email index
-    email_index = _load_email_index()
+    email_index = _load_email_index(shared=True)
     email_index[email.lower()] = user_id
     _save_email_index(email_index)
 
     # Update OAuth index
-    oauth_index = _load_oauth_index()
+    oauth_index = _load_oauth_index(shared=True)
     oauth_key = f"{oauth_provider}:{oauth_provider_id}"
     oauth_index[oauth_key] = user_id
     _save_oauth_index(oauth_index)
@@ -345,9 +583,7 @@ async def get_user_by_oauth(
     provider_id: str
 ) -> Optional[Dict[str, Any]]:
     """Get user by OAuth provider credentials."""
-    oauth_index = _load_oauth_index()
-    oauth_key = f"{provider}:{provider_id}"
-    user_id = oauth_index.get(oauth_key)
+    user_id = _load_oauth_index(shared=True).get(f"{provider}:{provider_id}")
 
     if not user_id:
         return None
@@ -377,11 +613,10 @@ async def link_oauth_to_existing_user(
     user["updated_at"] = datetime.utcnow().isoformat()
 
     # Save updated user
-    with open(_get_user_path(str(user_id)), 'w') as f:
-        json.dump(user, f, indent=2)
+    _write_json(_get_user_path(str(user_id)), user)
 
     # Update OAuth index
-    oauth_index = _load_oauth_index()
+    oauth_index = _load_oauth_index(shared=True)
     oauth_key = f"{oauth_provider}:{oauth_provider_id}"
     oauth_index[oauth_key] = str(user_id)
     _save_oauth_index(oauth_index)
@@ -406,17 +641,13 @@ async def save_user_api_key(
     """Save or update a user's API key."""
     _ensure_api_keys_dir()
     if key_version is None:
-        from .encryption import get_current_key_version
-        key_version = get_current_key_version() or 1
+        key_version = _encryption.get_current_key_version() or 1
 
     path = _get_api_keys_path(str(user_id))
     now = datetime.utcnow().isoformat()
 
     # Load existing keys
-    keys = {}
-    if path.exists():
-        with open(path, 'r') as f:
-            keys = json.load(f)
+    keys = _read_json(path) or {}
 
     # Generate an ID if this is a new key
     existing_id = keys.get(provider, {}).get("id")
@@ -434,8 +665,7 @@ async def save_user_api_key(
         "updated_at": now
     }
 
-    with open(path, 'w') as f:
-        json.dump(keys, f, indent=2)
+    _write_json(path, keys)
 
     return keys[provider]
 
@@ -445,50 +675,42 @@ async def get_user_api_key(user_id: UUID, provider: str) -> Optional[str]:
 
     Performs lazy re-encryption if the key was encrypted with an older key version.
     """
-    from .encryption import decrypt_api_key, rotate_api_key, get_current_key_version
-
     path = _get_api_keys_path(str(user_id))
+    keys = _read_json(path)
 
-    if not path.exists():
+    if keys is None:
         return None
 
-    with open(path, 'r') as f:
-        keys = json.load(f)
-
     key_data = keys.get(provider)
     if not key_data:
         return None
 
     encrypted = key_data["encrypted_key"]
     stored_version = key_data.get("key_version", 1)
-    current_version = get_current_key_version() or stored_version
+    current_version = _encryption.get_current_key_version() or stored_version
 
     if stored_version < current_version:
         try:
-            new_encrypted, was_rotated = rotate_api_key(encrypted)
+            new_encrypted, was_rotated = _encryption.rotate_api_key(encrypted)
             if was_rotated:
                 key_data["encrypted_key"] = new_encrypted
                 encrypted = new_encrypted
             key_data["key_version"] = current_version
             key_data["updated_at"] = datetime.utcnow().isoformat()
-            with open(path, 'w') as f:
-                json.dump(keys, f, indent=2)
+            _write_json(path, keys)
         except ValueError:
             pass  # Rotation failed, continue with original
 
-    return decrypt_api_key(encrypted)
+    return _encryption.decrypt_api_key(encrypted)
 
 
 async def get_user_api_keys(user_id: UUID) -> List[Dict[str, Any]]:
     """List all API keys for a user (metadata only, no decrypted keys)."""
-    path = _get_api_keys_path(str(user_id))
+    keys = _read_json(_get_api_keys_path(str(user_id)))
 
-    if not path.exists():
+    if keys is None:
         return []
 
-    with open(path, 'r') as f:
-        keys = json.load(f)
-
     return [
         {
             "id": data["id"],
@@ -504,20 +726,14 @@ async def get_user_api_keys(user_id: UUID) -> List[Dict[str, Any]]:
 async def delete_user_api_key(user_id: UUID, provider: str) -> bool:
     """Delete a user's API key."""
     path = _get_api_keys_path(str(user_id))
+    keys = _read_json(path)
 
-    if not path.exists():
-        return False
-
-    with open(path, 'r') as f:
-        keys = json.load(f)
-
-    if provider not in keys:
+    if keys is None or provider not in keys:
         return False
 
     del keys[provider]
 
-    with open(path, 'w') as f:
-        json.dump(keys, f, indent=2)
+    _write_json(path, keys)
 
     return True
 
@@ -539,21 +755,41 @@ def _get_user_credits_path(user_id: str) -> Path:
     return CREDITS_DIR / f"{user_id}.json"
 
 
+def _get_credit_log_path(user_id: str) -> Path:
+    """Get the path for a user's append-only credit transaction log."""
+    return CREDITS_DIR / f"{user_id}.transactions.jsonl"
+
+
 def _load_user_credits(user_id: str) -> Dict[str, Any]:
-    """Load user credits data."""
+    """Load user credits data (balances only; transactions live in the log).
+
+    Files written before the log existed may still carry a "transactions"
+    list; it is moved into the log on the next transaction.
+    """
     _ensure_credits_dir()
-    path = _get_user_credits_path(user_id)
-    if path.exists():
-        with open(path, 'r') as f:
-            return json.load(f)
-    return {"credits": 0, "openrouter_total_limit": 0, "transactions": []}
+    data = _read_json(_get_user_credits_path(user_id))
+    if data is not None:
+        return data
+    return {"credits": 0, "openrouter_total_limit": 0}
 
 
 def _save_user_credits(user_id: str, data: Dict[str, Any]):
     """Save user credits data."""
     _ensure_credits_dir()
-    with open(_get_user_credits_path(user_id), 'w') as f:
-        json.dump(data, f, indent=2)
+    _write_json(_get_user_credits_path(user_id), data)
+
+
+def _record_credit_transaction(user_id: str, data: Dict[str, Any], transaction: Dict[str, Any]):
+    """Append a transaction to the user's log and save the updated balance."""
+    legacy = data.pop("transactions", [])
+    # Log first: a crash in between leaves a duplicate, never a lost record
+    _append_log_file(_get_credit_log_path(user_id), [*legacy, transaction])
+    _save_user_credits(user_id, data)
+
+
+def _load_credit_transactions(user_id: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Load a user's transactions, including any not yet moved to the log."""
+    return data.get("transactions", []) + _read_log_file(_get_credit_log_path(user_id))
 
 
 async def get_user_credits(user_id: UUID) -> int:
@@ -573,7 +809,7 @@ async def add_credits(
     """Add credits to user and record transaction."""
     data = _load_user_credits(str(user_id))
     data["credits"] = data.get("credits", 0) + amount
-    data["transactions"].append({
+    _record_credit_transaction(str(user_id), data, {
         "id": str(uuid4()),
         "amount": amount,
         "balance_after": data["credits"],
@@ -582,7 +818,6 @@ async def add_credits(
         "stripe_session_id": stripe_session_id,
         "created_at": datetime.utcnow().isoformat()
     })
-    _save_user_credits(str(user_id), data)
     return data["credits"]
 
 
@@ -592,7 +827,7 @@ async def consume_credit(user_id: UUID, description: str = None) -> bool:
     if data.get("credits", 0) <= 0:
         return False
     data["credits"] -= 1
-    data["transactions"].append({
+    _record_credit_transaction(str(user_id), data, {
         "id": str(uuid4()),
         "amount": -1,
         "balance_after": data["credits"],
@@ -600,14 +835,13 @@ async def consume_credit(user_id: UUID, description: str = None) -> bool:
         "description": description,
         "created_at": datetime.utcnow().isoformat()
     })
-    _save_user_credits(str(user_id), data)
     return True
 
 
 async def get_credit_transactions(user_id: UUID, limit: int = 50) -> List[Dict]:
     """Get user's credit transaction history."""
     data = _load_user_credits(str(user_id))
-    transactions = data.get("transactions", [])
+    transactions = _load_credit_transactions(str(user_id), data)
     return sorted(transactions, key=lambda x: x["created_at"], reverse=True)[:limit]
 
 
@@ -662,12 +896,16 @@ async def was_session_processed(stripe_session_id: str) -> bool:
     """Check if a Stripe session was already processed."""
     # For local dev, check all user credit files
     _ensure_credits_dir()
-    for path in CREDITS_DIR.glob("*.json"):
-        with open(path, 'r') as f:
-            data = json.load(f)
-            for tx in data.get("transactions", []):
-                if tx.get("stripe_session_id") == stripe_session_id:
-                    return True
+    for path in _list_files(CREDITS_DIR, "*.jsonl"):
+        for tx in _read_log_file(path):
+            if tx.get("stripe_session_id") == stripe_session_id:
+                return True
+    # Transactions not yet moved into a log
+    for path in _list_json(CREDITS_DIR):
+        data = _read_json(path, shared=True) or {}
+        for tx in data.get("transactions", []):
+            if tx.get("stripe_session_id") == stripe_session_id:
+                return True
     return False
 
 
@@ -723,14 +961,11 @@ async def export_user_data(user_id: UUID) -> Dict[str, Any]:
     Returns a dict with account and conversation data, plus summary counts.
     """
     user_id_str = str(user_id)
-    user_path = USERS_DIR / f"{user_id_str}.json"
+    user = _read_json(_get_user_path(user_id_str))
 
-    if not user_path.exists():
+    if user is None:
         return None
 
-    with open(user_path, 'r') as f:
-        user = json.load(f)
-
     account_data = {
         "email": user.get("email"),
         "name": user.get("name"),
@@ -746,11 +981,11 @@ async def export_user_data(user_id: UUID) -> Dict[str, Any]:
     # Get all conversations for this user
     conversations = []
     total_messages = 0
-    _ensure_data_dir()
-    for conv_file in DATA_DIR.glob("*.json"):
-        with open(conv_file, 'r') as f:
-            conv = json.load(f)
-        if conv.get("user_id") == user_id_str:
+    for conv_id, entry in _load_conversation_index(shared=True).items():
+        if entry["user_id"] != user_id_str:
+            continue
+        conv = _read_json(_get_conversation_path(conv_id))
+        if conv is not None:
             messages = conv.get("messages", [])
             total_messages += len(messages)
             conversations.append({
@@ -788,30 +1023,28 @@ async def delete_user_account(user_id: UUID) -> tuple[bool, Optional[str]]:
         - openrouter_key_hash: Always None for local storage
     """
     user_id_str = str(user_id)
-    user_path = USERS_DIR / f"{user_id_str}.json"
+    user_path = _get_user_path(user_id_str)
 
-    if not user_path.exists():
+    if _read_json(user_path) is None:
         return False, None
 
     # Delete user's conversations
-    _ensure_data_dir()
-    for conv_file in DATA_DIR.glob("*.json"):
-        with open(conv_file, 'r') as f:
-            conv = json.load(f)
-        if conv.get("user_id") == user_id_str:
-            conv_file.unlink()
+    index = _load_conversation_index(shared=True)
+    owned = [conv_id for conv_id, entry in index.items() if entry["user_id"] == user_id_str]
+    for conv_id in owned:
+        _delete_json(_get_conversation_path(conv_id))
+        del index[conv_id]
+    if owned:
+        _save_conversation_index(index)
 
     # Delete user's API key file if exists
-    api_key_path = API_KEYS_DIR / f"{user_id_str}.json"
-    if api_key_path.exists():
-        api_key_path.unlink()
+    _delete_json(_get_api_keys_path(user_id_str))
 
-    # Delete user's credits file if exists
-    credits_path = USERS_DIR / f"{user_id_str}_credits.json"
-    if credits_path.exists():
-        credits_path.unlink()
+    # Delete user's credit balances and transaction log if they exist
+    _delete_json(_get_user_credits_path(user_id_str))
+    _delete_file(_get_credit_log_path(user_id_str))
 
     # Delete user file
-    user_path.unlink()
+    _delete_json(user_path)
 
     return True, None
@@ -1,9 +1,13 @@
 """
 Shared pytest fixtures for backend tests.
 """
+import itertools
+import json
 import os
+import shutil
 import pytest
 from unittest.mock import AsyncMock, patch
+from uuid import UUID
 
 # Custom marker for Postgres-only tests
 def pytest_configure(config):
@@ -18,6 +22,22 @@ requires_postgres = pytest.mark.skipif(
 )
 
 
+# Session-wide source for uid(); each xdist worker counts on its own
+_uid_counter = itertools.count(1)
+
+
+@pytest.fixture
+def uid():
+    """Factory for unique, deterministic UUIDs (cheaper than uuid4)."""
+    return lambda: UUID(int=next(_uid_counter))
+
+
+@pytest.fixture
+def user_id(uid):
+    """A fresh user ID for tests that need just one (drawn from uid)."""
+    return uid()
+
+
 @pytest.fixture
 def auth_headers():
     """Create valid auth headers for API tests."""
@@ -42,17 +62,92 @@ def mock_storage():
         yield mock
 
 
+@pytest.fixture(scope="session")
+def storage_dirs(tmp_path_factory, worker_id):
+    """Point storage_local at temp directories once per session.
+
+    Each xdist worker runs its own session and gets its own storage_<worker>
+    root, so workers never share files. worker_id is "master" without -n.
+    """
+    root = tmp_path_factory.mktemp(f"storage_{worker_id}")
+    dirs = {
+        "DATA_DIR": root / "data",
+        "USERS_DIR": root / "users",
+        "API_KEYS_DIR": root / "keys",
+        "CREDITS_DIR": root / "credits",
+    }
+    with pytest.MonkeyPatch.context() as mp:
+        for name, path in dirs.items():
+            mp.setattr(f"backend.storage_local.{name}", path)
+        yield list(dirs.values())
+
+
+@pytest.fixture
+def isolated_storage(storage_dirs):
+    """Isolate storage_local to temp directories for test safety.
+
+    The directories are shared across the session and emptied before each
+    test, which is cheaper than a fresh tmp_path per test.
+    """
+    from backend import storage_local
+
+    for path in storage_dirs:
+        shutil.rmtree(path, ignore_errors=True)
+        path.mkdir()
+    storage_local._doc_cache.clear()
+
+    return storage_local
+
+
+class MemoryFiles:
+    """In-memory stand-in for storage_local's JSON file helpers.
+
+    Values are kept serialized, so tests still catch data JSON can't hold.
+    """
+
+    def __init__(self):
+        self.files = {}
+
+    def read(self, path, shared=False):
+        raw = self.files.get(path)
+        return None if raw is None else json.loads(raw)
+
+    def write(self, path, data):
+        # Re-insert so iteration order follows write order
+        self.files.pop(path, None)
+        self.files[path] = json.dumps(data)
+
+    def delete(self, path):
+        return self.files.pop(path, None) is not None
+
+    def list(self, directory, pattern="*.json"):
+        return [
+            path for path in reversed(self.files)
+            if path.parent == directory and path.match(pattern)
+        ]
+
+    def read_log(self, path):
+        raw = self.files.get(path, "")
+        return [json.loads(line) for line in raw.splitlines()]
+
+    def append_log(self, path, records):
+        raw = self.files.pop(path, "")
+        self.files[path] = raw + "".join(json.dumps(record) + "\n" for record in records)
+
+
 @pytest.fixture
-def isolated_storage(tmp_path, monkeypatch):
-    """Isolate storage_local to temp directories for test safety."""
-    monkeypatch.setattr("backend.storage_local.DATA_DIR", tmp_path / "data")
-    monkeypatch.setattr("backend.storage_local.USERS_DIR", tmp_path / "users")
-    monkeypatch.setattr("backend.storage_local.API_KEYS_DIR", tmp_path / "keys")
-
-    # Create directories
-    (tmp_path / "data").mkdir()
-    (tmp_path / "users").mkdir()
-    (tmp_path / "keys").mkdir()
+def memory_storage(storage_dirs, monkeypatch):
+    """storage_local with file I/O replaced by an in-memory dict.
+
+    For unit tests of storage logic; isolated_storage covers the disk path.
+    """
+    files = MemoryFiles()
+    monkeypatch.setattr("backend.storage_local._read_file", files.read)
+    monkeypatch.setattr("backend.storage_local._write_file", files.write)
+    monkeypatch.setattr("backend.storage_local._delete_file", files.delete)
+    monkeypatch.setattr("backend.storage_local._list_files", files.list)
+    monkeypatch.setattr("backend.storage_local._read_log_file", files.read_log)
+    monkeypatch.setattr("backend.storage_local._append_log_file", files.append_log)
 
     from backend import storage_local
     return storage_local
@@ -5,17 +5,16 @@ Tests balance checks, deposits, cost deduction, and usage tracking.
 """
 import pytest
 from unittest.mock import AsyncMock, patch
-from uuid import uuid4
 from httpx import AsyncClient, ASGITransport
 
 from backend.main import app
 
 
 @pytest.fixture
-def auth_headers():
+def auth_headers(user_id):
     """Create valid auth headers for API tests."""
     from backend.auth_jwt import create_access_token
-    token = create_access_token(user_id=uuid4())
+    token = create_access_token(user_id=user_id)
     return {"Authorization": f"Bearer {token}"}
 
 
@@ -58,12 +57,12 @@ class TestDepositOptionsEndpoint:
     """Tests for GET /api/deposits/options endpoint."""
 
     @pytest.mark.asyncio
-    async def test_get_deposit_options(self, auth_headers):
+    async def test_get_deposit_options(self, auth_headers, uid):
         """Returns available deposit options."""
         with patch("backend.main.storage") as mock_storage:
             mock_storage.get_deposit_options = AsyncMock(return_value=[
-                {"id": uuid4(), "name": "$1 Try It", "amount_cents": 100},
-                {"id": uuid4(), "name": "$5 Deposit", "amount_cents": 500},
+                {"id": uid(), "name": "$1 Try It", "amount_cents": 100},
+                {"id": uid(), "name": "$5 Deposit", "amount_cents": 500},
             ])
 
             transport = ASGITransport(app=app)
@@ -81,13 +80,13 @@ class TestUsageHistoryEndpoint:
     """Tests for GET /api/usage/history endpoint."""
 
     @pytest.mark.asyncio
-    async def test_get_usage_history(self, auth_headers):
+    async def test_get_usage_history(self, auth_headers, uid):
         """Returns usage history for authenticated user."""
         from datetime import datetime
         with patch("backend.main.storage") as mock_storage:
             mock_storage.get_usage_history = AsyncMock(return_value=[
                 {
-                    "id": uuid4(),
+                    "id": uid(),
                     "conversation_id": "conv-123",
                     "openrouter_cost": 0.0234,
                     "margin_cost": 0.0023,
@@ -285,10 +284,8 @@ class TestCostDeductionLogic:
     """Tests for cost deduction logic using local storage stubs."""
 
     @pytest.mark.asyncio
-    async def test_add_and_consume_credits(self, isolated_storage):
+    async def test_add_and_consume_credits(self, isolated_storage, user_id):
         """Credits can be added and consumed."""
-        user_id = uuid4()
-
         # Add credits
         balance = await isolated_storage.add_credits(
             user_id=user_id,
@@ -307,18 +304,14 @@ class TestCostDeductionLogic:
         assert remaining == 9
 
     @pytest.mark.asyncio
-    async def test_cannot_consume_without_credits(self, isolated_storage):
+    async def test_cannot_consume_without_credits(self, isolated_storage, user_id):
         """Cannot consume credits when balance is 0."""
-        user_id = uuid4()
-
         success = await isolated_storage.consume_credit(user_id, "Query")
         assert success is False
 
     @pytest.mark.asyncio
-    async def test_transaction_history_recorded(self, isolated_storage):
+    async def test_transaction_history_recorded(self, isolated_storage, user_id):
         """Transactions are recorded in history."""
-        user_id = uuid4()
-
         await isolated_storage.add_credits(user_id, 5, "deposit", "Initial")
         await isolated_storage.consume_credit(user_id, "Query 1")
         await isolated_storage.consume_credit(user_id, "Query 2")
@@ -336,10 +329,8 @@ class TestMinimumBalanceCheck:
     """Tests for minimum balance check logic."""
 
     @pytest.mark.asyncio
-    async def test_balance_above_minimum_allows_query(self, isolated_storage):
+    async def test_balance_above_minimum_allows_query(self, isolated_storage, user_id):
         """Query is allowed when balance is above minimum."""
-        user_id = uuid4()
-
         # Add $1.00 worth of credits (in the stub, this is integer credits)
         await isolated_storage.add_credits(user_id, 10, "deposit")
 
@@ -348,10 +339,8 @@ class TestMinimumBalanceCheck:
         assert balance >= 1  # Has at least 1 credit
 
     @pytest.mark.asyncio
-    async def test_balance_below_minimum_blocks_query(self, isolated_storage):
+    async def test_balance_below_minimum_blocks_query(self, isolated_storage, user_id):
         """Query is blocked when balance is below minimum."""
-        user_id = uuid4()
-
         # No credits
         balance = await isolated_storage.get_user_credits(user_id)
         assert balance == 0
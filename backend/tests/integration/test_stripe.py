@@ -5,10 +5,13 @@ Uses unittest.mock to mock the Stripe SDK calls.
 Tests checkout session creation, webhook verification, and customer management.
 """
 import pytest
-from unittest.mock import patch, MagicMock
+from types import SimpleNamespace
+from unittest.mock import patch
 from uuid import uuid4
 
 import stripe
+from stripe import Customer as _Customer, Webhook as _Webhook
+from stripe.checkout import Session as _CheckoutSession
 
 from backend.stripe_client import (
     create_checkout_session,
@@ -23,39 +26,35 @@ from backend.stripe_client import (
 class TestStripeConfiguration:
     """Tests for Stripe configuration checks."""
 
-    def test_is_stripe_configured_with_key(self):
-        """Returns True when STRIPE_SECRET_KEY is set."""
-        with patch("backend.stripe_client.STRIPE_SECRET_KEY", "sk_test_123"):
-            assert is_stripe_configured() is True
-
-    def test_is_stripe_configured_without_key(self):
-        """Returns False when STRIPE_SECRET_KEY is not set."""
-        with patch("backend.stripe_client.STRIPE_SECRET_KEY", None):
-            assert is_stripe_configured() is False
-
-    def test_is_webhook_configured_with_secret(self):
-        """Returns True when STRIPE_WEBHOOK_SECRET is set."""
-        with patch("backend.stripe_client.STRIPE_WEBHOOK_SECRET", "whsec_123"):
-            assert is_webhook_configured() is True
-
-    def test_is_webhook_configured_without_secret(self):
-        """Returns False when STRIPE_WEBHOOK_SECRET is not set."""
-        with patch("backend.stripe_client.STRIPE_WEBHOOK_SECRET", None):
-            assert is_webhook_configured() is False
+    @pytest.mark.parametrize("attr, value, check, expected", [
+        ("STRIPE_SECRET_KEY", "sk_test_123", is_stripe_configured, True),
+        ("STRIPE_SECRET_KEY", None, is_stripe_configured, False),
+        ("STRIPE_WEBHOOK_SECRET", "whsec_123", is_webhook_configured, True),
+        ("STRIPE_WEBHOOK_SECRET", None, is_webhook_configured, False),
+    ], ids=[
+        "stripe_with_key",
+        "stripe_without_key",
+        "webhook_with_secret",
+        "webhook_without_secret",
+    ])
+    def test_configuration_checks(self, attr, value, check, expected):
+        """Configuration checks reflect whether the secret is set."""
+        with patch(f"backend.stripe_client.{attr}", value):
+            assert check() is expected
 
 
 class TestCreateCheckoutSession:
     """Tests for create_checkout_session function."""
 
-    @pytest.mark.asyncio
     async def test_create_session_success(self):
         """Successfully creates checkout session."""
-        mock_session = MagicMock()
-        mock_session.id = "cs_test_123"
-        mock_session.url = "https://checkout.stripe.com/test"
+        mock_session = SimpleNamespace(
+            id="cs_test_123",
+            url="https://checkout.stripe.com/test",
+        )
 
         with patch("backend.stripe_client.STRIPE_SECRET_KEY", "sk_test_123"), \
-             patch("stripe.checkout.Session.create", return_value=mock_session):
+             patch.object(_CheckoutSession, "create", return_value=mock_session):
 
             result = await create_checkout_session(
                 user_id=uuid4(),
@@ -73,15 +72,15 @@ class TestCreateCheckoutSession:
         assert result["session_id"] == "cs_test_123"
         assert result["checkout_url"] == "https://checkout.stripe.com/test"
 
-    @pytest.mark.asyncio
     async def test_create_session_with_existing_customer(self):
         """Uses existing customer ID when provided."""
-        mock_session = MagicMock()
-        mock_session.id = "cs_test_456"
-        mock_session.url = "https://checkout.stripe.com/test2"
+        mock_session = SimpleNamespace(
+            id="cs_test_456",
+            url="https://checkout.stripe.com/test2",
+        )
 
         with patch("backend.stripe_client.STRIPE_SECRET_KEY", "sk_test_123"), \
-             patch("stripe.checkout.Session.create", return_value=mock_session) as mock_create:
+             patch.object(_CheckoutSession, "create", return_value=mock_session) as mock_create:
 
             await create_checkout_session(
                 user_id=uuid4(),
@@ -102,18 +101,18 @@ class TestCreateCheckoutSession:
         assert call_kwargs["customer"] == "cus_existing123"
         assert "customer_email" not in call_kwargs
 
-    @pytest.mark.asyncio
     async def test_create_session_metadata_for_deposit(self):
         """Deposit sessions include correct metadata."""
-        mock_session = MagicMock()
-        mock_session.id = "cs_test_789"
-        mock_session.url = "https://checkout.stripe.com/test3"
+        mock_session = SimpleNamespace(
+            id="cs_test_789",
+            url="https://checkout.stripe.com/test3",
+        )
 
         user_id = uuid4()
         pack_id = uuid4()
 
         with patch("backend.stripe_client.STRIPE_SECRET_KEY", "sk_test_123"), \
-             patch("stripe.checkout.Session.create", return_value=mock_session) as mock_create:
+             patch.object(_CheckoutSession, "create", return_value=mock_session) as mock_create:
 
             await create_checkout_session(
                 user_id=user_id,
@@ -135,7 +134,6 @@ class TestCreateCheckoutSession:
         assert metadata["is_deposit"] == "true"
         assert metadata["openrouter_limit_dollars"] == "5.0"
 
-    @pytest.mark.asyncio
     async def test_create_session_not_configured(self):
         """Raises error when Stripe not configured."""
         with patch("backend.stripe_client.STRIPE_SECRET_KEY", None):
@@ -161,7 +159,7 @@ class TestVerifyWebhookSignature:
         mock_event = {"type": "checkout.session.completed", "data": {}}
 
         with patch("backend.stripe_client.STRIPE_WEBHOOK_SECRET", "whsec_test"), \
-             patch("stripe.Webhook.construct_event", return_value=mock_event):
+             patch.object(_Webhook, "construct_event", return_value=mock_event):
 
             result = verify_webhook_signature(
                 payload=b'{"test": "payload"}',
@@ -173,7 +171,7 @@ class TestVerifyWebhookSignature:
     def test_verify_invalid_signature(self):
         """Invalid signature raises error."""
         with patch("backend.stripe_client.STRIPE_WEBHOOK_SECRET", "whsec_test"), \
-             patch("stripe.Webhook.construct_event") as mock_construct:
+             patch.object(_Webhook, "construct_event") as mock_construct:
             mock_construct.side_effect = stripe.error.SignatureVerificationError(
                 "Invalid signature", "sig"
             )
@@ -199,13 +197,14 @@ class TestGetSessionDetails:
 
     def test_get_session_success(self):
         """Successfully retrieves session details."""
-        mock_session = MagicMock()
-        mock_session.id = "cs_test_retrieve"
-        mock_session.payment_status = "paid"
-        mock_session.amount_total = 500
+        mock_session = SimpleNamespace(
+            id="cs_test_retrieve",
+            payment_status="paid",
+            amount_total=500,
+        )
 
         with patch("backend.stripe_client.STRIPE_SECRET_KEY", "sk_test_123"), \
-             patch("stripe.checkout.Session.retrieve", return_value=mock_session):
+             patch.object(_CheckoutSession, "retrieve", return_value=mock_session):
 
             result = get_session_details("cs_test_retrieve")
 
@@ -224,14 +223,11 @@ class TestGetOrCreateCustomer:
 
     def test_get_existing_customer(self):
         """Returns existing customer ID when found."""
-        mock_customer = MagicMock()
-        mock_customer.id = "cus_existing"
-
-        mock_search_result = MagicMock()
-        mock_search_result.data = [mock_customer]
+        mock_customer = SimpleNamespace(id="cus_existing")
+        mock_search_result = SimpleNamespace(data=[mock_customer])
 
         with patch("backend.stripe_client.STRIPE_SECRET_KEY", "sk_test_123"), \
-             patch("stripe.Customer.search", return_value=mock_search_result):
+             patch.object(_Customer, "search", return_value=mock_search_result):
 
             result = get_or_create_customer("existing@example.com")
 
@@ -239,15 +235,12 @@ class TestGetOrCreateCustomer:
 
     def test_create_new_customer(self):
         """Creates new customer when not found."""
-        mock_search_result = MagicMock()
-        mock_search_result.data = []  # No existing customer
-
-        mock_new_customer = MagicMock()
-        mock_new_customer.id = "cus_new123"
+        mock_search_result = SimpleNamespace(data=[])  # No existing customer
+        mock_new_customer = SimpleNamespace(id="cus_new123")
 
         with patch("backend.stripe_client.STRIPE_SECRET_KEY", "sk_test_123"), \
-             patch("stripe.Customer.search", return_value=mock_search_result), \
-             patch("stripe.Customer.create", return_value=mock_new_customer):
+             patch.object(_Customer, "search", return_value=mock_search_result), \
+             patch.object(_Customer, "create", return_value=mock_new_customer):
 
             result = get_or_create_customer("new@example.com", name="New User")
 
@@ -255,15 +248,12 @@ class TestGetOrCreateCustomer:
 
     def test_create_customer_with_name(self):
         """Includes name when creating customer."""
-        mock_search_result = MagicMock()
-        mock_search_result.data = []
-
-        mock_new_customer = MagicMock()
-        mock_new_customer.id = "cus_named"
+        mock_search_result = SimpleNamespace(data=[])
+        mock_new_customer = SimpleNamespace(id="cus_named")
 
         with patch("backend.stripe_client.STRIPE_SECRET_KEY", "sk_test_123"), \
-             patch("stripe.Customer.search", return_value=mock_search_result), \
-             patch("stripe.Customer.create", return_value=mock_new_customer) as mock_create:
+             patch.object(_Customer, "search", return_value=mock_search_result), \
+             patch.object(_Customer, "create", return_value=mock_new_customer) as mock_create:
 
             get_or_create_customer("test@example.com", name="Test User")
 
@@ -279,11 +269,10 @@ class TestGetOrCreateCustomer:
 class TestStripeErrorHandling:
     """Tests for Stripe API error handling."""
 
-    @pytest.mark.asyncio
     async def test_create_session_api_error(self):
         """Propagates Stripe API errors."""
         with patch("backend.stripe_client.STRIPE_SECRET_KEY", "sk_test_123"), \
-             patch("stripe.checkout.Session.create") as mock_create:
+             patch.object(_CheckoutSession, "create") as mock_create:
             mock_create.side_effect = stripe.error.StripeError("API error")
 
             with pytest.raises(stripe.error.StripeError):
@@ -302,7 +291,7 @@ class TestStripeErrorHandling:
     def test_retrieve_session_not_found(self):
         """Handles session not found error."""
         with patch("backend.stripe_client.STRIPE_SECRET_KEY", "sk_test_123"), \
-             patch("stripe.checkout.Session.retrieve") as mock_retrieve:
+             patch.object(_CheckoutSession, "retrieve") as mock_retrieve:
             mock_retrieve.side_effect = stripe.error.InvalidRequestError(
                 "No such session", "session_id"
             )
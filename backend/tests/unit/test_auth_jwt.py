@@ -4,9 +4,8 @@ Unit tests for backend.auth_jwt module.
 Tests JWT token creation, verification, and FastAPI dependencies.
 """
 import pytest
-from uuid import UUID, uuid4
+from uuid import UUID
 from datetime import datetime, timedelta, timezone
-from freezegun import freeze_time
 from fastapi import HTTPException
 
 from backend.auth_jwt import (
@@ -23,18 +22,16 @@ from backend.auth_jwt import (
 class TestCreateAccessToken:
     """Tests for create_access_token function."""
 
-    def test_creates_valid_token(self):
+    def test_creates_valid_token(self, user_id):
         """Token can be decoded and contains correct user_id."""
-        user_id = uuid4()
         token = create_access_token(user_id)
 
         # Verify the token is valid and returns the user_id
         result = verify_token(token, "access")
         assert result == user_id
 
-    def test_token_type_is_access(self):
+    def test_token_type_is_access(self, user_id):
         """Token has type 'access' in payload."""
-        user_id = uuid4()
         token = create_access_token(user_id)
 
         # Should work with access type
@@ -46,44 +43,43 @@ class TestCreateAccessToken:
         assert exc.value.status_code == 401
         assert "Invalid token type" in exc.value.detail
 
-    @freeze_time("2026-01-05 12:00:00")
-    def test_expiration_time(self):
+    def test_expiration_time(self, user_id):
         """Token expires after ACCESS_TOKEN_EXPIRE_MINUTES."""
-        user_id = uuid4()
-        token = create_access_token(user_id)
+        t0 = datetime(2026, 1, 5, 12, 0, 0, tzinfo=timezone.utc)
+        token = create_access_token(user_id, now=t0)
 
         # Should be valid at creation time
-        verify_token(token, "access")
+        verify_token(token, "access", now=t0)
 
         # Should be valid just before expiration
-        with freeze_time(datetime(2026, 1, 5, 12, 0, 0, tzinfo=timezone.utc) +
-                        timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES - 1)):
-            verify_token(token, "access")
+        verify_token(
+            token, "access",
+            now=t0 + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES - 1)
+        )
 
         # Should be expired after expiration time
-        with freeze_time(datetime(2026, 1, 5, 12, 0, 0, tzinfo=timezone.utc) +
-                        timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES + 1)):
-            with pytest.raises(HTTPException) as exc:
-                verify_token(token, "access")
-            assert exc.value.status_code == 401
-            assert "expired" in exc.value.detail.lower()
+        with pytest.raises(HTTPException) as exc:
+            verify_token(
+                token, "access",
+                now=t0 + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES + 1)
+            )
+        assert exc.value.status_code == 401
+        assert "expired" in exc.value.detail.lower()
 
 
 class TestCreateRefreshToken:
     """Tests for create_refresh_token function."""
 
-    def test_creates_valid_token(self):
+    def test_creates_valid_token(self, user_id):
         """Token can be decoded and contains correct user_id."""
-        user_id = uuid4()
         token = create_refresh_token(user_id)
 
         # Verify the token is valid and returns the user_id
         result = verify_token(token, "refresh")
         assert result == user_id
 
-    def test_token_type_is_refresh(self):
+    def test_token_type_is_refresh(self, user_id):
         """Token has type 'refresh' in payload."""
-        user_id = uuid4()
         token = create_refresh_token(user_id)
 
         # Should work with refresh type
@@ -95,35 +91,35 @@ class TestCreateRefreshToken:
         assert exc.value.status_code == 401
         assert "Invalid token type" in exc.value.detail
 
-    @freeze_time("2026-01-05 12:00:00")
-    def test_expiration_time(self):
+    def test_expiration_time(self, user_id):
         """Token expires after REFRESH_TOKEN_EXPIRE_DAYS."""
-        user_id = uuid4()
-        token = create_refresh_token(user_id)
+        t0 = datetime(2026, 1, 5, 12, 0, 0, tzinfo=timezone.utc)
+        token = create_refresh_token(user_id, now=t0)
 
         # Should be valid at creation time
-        verify_token(token, "refresh")
+        verify_token(token, "refresh", now=t0)
 
         # Should be valid just before expiration
-        with freeze_time(datetime(2026, 1, 5, 12, 0, 0, tzinfo=timezone.utc) +
-                        timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS - 1)):
-            verify_token(token, "refresh")
+        verify_token(
+            token, "refresh",
+            now=t0 + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS - 1)
+        )
 
         # Should be expired after expiration time
-        with freeze_time(datetime(2026, 1, 5, 12, 0, 0, tzinfo=timezone.utc) +
-                        timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS + 1)):
-            with pytest.raises(HTTPException) as exc:
-                verify_token(token, "refresh")
-            assert exc.value.status_code == 401
-            assert "expired" in exc.value.detail.lower()
+        with pytest.raises(HTTPException) as exc:
+            verify_token(
+                token, "refresh",
+                now=t0 + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS + 1)
+            )
+        assert exc.value.status_code == 401
+        assert "expired" in exc.value.detail.lower()
 
 
 class TestVerifyToken:
     """Tests for verify_token function."""
 
-    def test_returns_uuid(self):
+    def test_returns_uuid(self, user_id):
         """Returns a UUID object, not a string."""
-        user_id = uuid4()
         token = create_access_token(user_id)
 
         result = verify_token(token, "access")
@@ -138,9 +134,8 @@ class TestVerifyToken:
         assert exc.value.status_code == 401
         assert "Invalid token" in exc.value.detail
 
-    def test_tampered_token(self):
+    def test_tampered_token(self, user_id):
         """Raises 401 for tokens with invalid signature."""
-        user_id = uuid4()
         token = create_access_token(user_id)
 
         # Tamper with the token by changing a character
@@ -172,7 +167,6 @@ class TestVerifyToken:
 class TestGetCurrentUser:
     """Tests for get_current_user FastAPI dependency."""
 
-    @pytest.mark.asyncio
     async def test_no_credentials_raises_401(self):
         """Raises 401 when no credentials provided."""
         with pytest.raises(HTTPException) as exc:
@@ -181,12 +175,10 @@ class TestGetCurrentUser:
         assert "Not authenticated" in exc.value.detail
         assert exc.value.headers == {"WWW-Authenticate": "Bearer"}
 
-    @pytest.mark.asyncio
-    async def test_valid_credentials_returns_user_id(self):
+    async def test_valid_credentials_returns_user_id(self, user_id):
         """Returns user_id for valid credentials."""
         from unittest.mock import Mock
 
-        user_id = uuid4()
         token = create_access_token(user_id)
 
         credentials = Mock()
@@ -196,7 +188,6 @@ class TestGetCurrentUser:
 
         assert result == user_id
 
-    @pytest.mark.asyncio
     async def test_invalid_credentials_raises_401(self):
         """Raises 401 for invalid token in credentials."""
         from unittest.mock import Mock
@@ -212,18 +203,15 @@ class TestGetCurrentUser:
 class TestGetOptionalUser:
     """Tests for get_optional_user FastAPI dependency."""
 
-    @pytest.mark.asyncio
     async def test_no_credentials_returns_none(self):
         """Returns None when no credentials provided."""
         result = await get_optional_user(None)
         assert result is None
 
-    @pytest.mark.asyncio
-    async def test_valid_credentials_returns_user_id(self):
+    async def test_valid_credentials_returns_user_id(self, user_id):
         """Returns user_id for valid credentials."""
         from unittest.mock import Mock
 
-        user_id = uuid4()
         token = create_access_token(user_id)
 
         credentials = Mock()
@@ -233,7 +221,6 @@ class TestGetOptionalUser:
 
         assert result == user_id
 
-    @pytest.mark.asyncio
     async def test_invalid_credentials_returns_none(self):
         """Returns None for invalid credentials (doesn't raise)."""
         from unittest.mock import Mock
@@ -245,21 +232,18 @@ class TestGetOptionalUser:
 
         assert result is None
 
-    @pytest.mark.asyncio
-    async def test_expired_token_returns_none(self):
+    async def test_expired_token_returns_none(self, user_id):
         """Returns None for expired tokens (doesn't raise)."""
         from unittest.mock import Mock
 
-        user_id = uuid4()
-
-        with freeze_time("2026-01-01 12:00:00"):
-            token = create_access_token(user_id)
+        # Issue the token a day ago so it is already expired
+        token = create_access_token(
+            user_id, now=datetime.now(timezone.utc) - timedelta(days=1)
+        )
 
-        # Token is now expired
         credentials = Mock()
         credentials.credentials = token
 
-        with freeze_time("2026-01-02 12:00:00"):
-            result = await get_optional_user(credentials)
+        result = await get_optional_user(credentials)
 
         assert result is None
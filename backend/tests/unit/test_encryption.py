@@ -7,6 +7,22 @@ import pytest
 from unittest.mock import patch
 from cryptography.fernet import Fernet
 
+from backend.encryption import (
+    encrypt_api_key,
+    encrypt_api_key_bytes,
+    encrypt_api_keys,
+    decrypt_api_key,
+    decrypt_api_key_bytes,
+    rotate_api_key,
+    rotate_api_keys,
+    get_key_hint,
+    get_key_hints,
+    get_key_count,
+    get_current_key_version,
+    _get_fernet,
+    _key_id,
+)
+
 
 # Generate test keys
 TEST_KEY_1 = Fernet.generate_key().decode()
@@ -20,8 +36,6 @@ class TestEncryptDecrypt:
     def test_encrypt_decrypt_roundtrip(self):
         """Encrypted key can be decrypted back to original."""
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
-            from backend.encryption import encrypt_api_key, decrypt_api_key
-
             original = "sk-or-v1-abc123xyz789"
             encrypted = encrypt_api_key(original)
 
@@ -31,8 +45,6 @@ class TestEncryptDecrypt:
     def test_encrypted_output_is_string(self):
         """Encrypted output is a string (not bytes)."""
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
-            from backend.encryption import encrypt_api_key
-
             encrypted = encrypt_api_key("test-key")
 
             assert isinstance(encrypted, str)
@@ -40,8 +52,6 @@ class TestEncryptDecrypt:
     def test_same_key_different_ciphertext(self):
         """Same key encrypted twice produces different ciphertext (due to IV)."""
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
-            from backend.encryption import encrypt_api_key
-
             original = "sk-or-v1-abc123"
             encrypted1 = encrypt_api_key(original)
             encrypted2 = encrypt_api_key(original)
@@ -51,8 +61,6 @@ class TestEncryptDecrypt:
     def test_decrypt_invalid_token_raises(self):
         """Decrypting invalid data raises ValueError."""
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
-            from backend.encryption import decrypt_api_key
-
             with pytest.raises(ValueError) as exc:
                 decrypt_api_key("not-a-valid-encrypted-string")
             assert "Failed to decrypt" in str(exc.value)
@@ -61,13 +69,10 @@ class TestEncryptDecrypt:
         """Decrypting with wrong key raises ValueError."""
         # Encrypt with key 1
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
-            from backend.encryption import encrypt_api_key
             encrypted = encrypt_api_key("test-key")
 
         # Try to decrypt with key 2
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_2]):
-            from backend.encryption import decrypt_api_key
-
             with pytest.raises(ValueError) as exc:
                 decrypt_api_key(encrypted)
             assert "Failed to decrypt" in str(exc.value)
@@ -80,12 +85,10 @@ class TestKeyRotation:
         """Data encrypted with old key can be decrypted when both keys present."""
         # Encrypt with old key only
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
-            from backend.encryption import encrypt_api_key
             encrypted = encrypt_api_key("my-secret-key")
 
         # Decrypt with new key first, old key second (rotation scenario)
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_2, TEST_KEY_1]):
-            from backend.encryption import decrypt_api_key
             decrypted = decrypt_api_key(encrypted)
 
             assert decrypted == "my-secret-key"
@@ -94,12 +97,10 @@ class TestKeyRotation:
         """Key encrypted with old key gets re-encrypted with new key."""
         # Encrypt with old key
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
-            from backend.encryption import encrypt_api_key
             old_encrypted = encrypt_api_key("my-secret-key")
 
         # Rotate to new key
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_2, TEST_KEY_1]):
-            from backend.encryption import rotate_api_key, decrypt_api_key
             new_encrypted, was_rotated = rotate_api_key(old_encrypted)
 
             assert was_rotated is True
@@ -108,59 +109,175 @@ class TestKeyRotation:
 
         # New encrypted version should work with only the new key
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_2]):
-            from backend.encryption import decrypt_api_key
             decrypted = decrypt_api_key(new_encrypted)
             assert decrypted == "my-secret-key"
 
     def test_rotate_api_key_already_current(self):
         """Key already encrypted with newest key is not rotated."""
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
-            from backend.encryption import encrypt_api_key
             encrypted = encrypt_api_key("my-secret-key")
 
         # Same key is still primary
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1, TEST_KEY_2]):
-            from backend.encryption import rotate_api_key
             new_encrypted, was_rotated = rotate_api_key(encrypted)
 
             assert was_rotated is False
             assert new_encrypted == encrypted
 
+    def test_rotate_current_token_skips_decrypt(self):
+        """Tokens under the primary key are recognised without decrypting."""
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
+            encrypted = encrypt_api_key("my-secret-key")
+
+            with patch.object(Fernet, "decrypt") as mock_decrypt:
+                assert rotate_api_key(encrypted) == (encrypted, False)
+            mock_decrypt.assert_not_called()
+
     def test_rotate_invalid_key_raises(self):
         """Rotating invalid encrypted data raises ValueError."""
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
-            from backend.encryption import rotate_api_key
-
             with pytest.raises(ValueError) as exc:
                 rotate_api_key("invalid-encrypted-data")
             assert "Failed to rotate" in str(exc.value)
 
 
+class TestTokenFormat:
+    """Tests for key-id prefixed ciphertexts and legacy tokens."""
+
+    def test_encrypted_output_has_key_id_prefix(self):
+        """New ciphertexts are prefixed with the format version and key id."""
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
+            encrypted = encrypt_api_key("test-key")
+
+            assert encrypted.startswith(f"v2:{_key_id(TEST_KEY_1)}:")
+
+    def test_decrypt_legacy_token(self):
+        """Unprefixed Fernet tokens from before the key-id format still decrypt."""
+        legacy = Fernet(TEST_KEY_1.encode()).encrypt(b"legacy-key").decode()
+
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_2, TEST_KEY_1]):
+            assert decrypt_api_key(legacy) == "legacy-key"
+
+    def test_rotate_legacy_token_with_old_key(self):
+        """Legacy tokens under an old key are re-encrypted in the prefixed format."""
+        legacy = Fernet(TEST_KEY_1.encode()).encrypt(b"legacy-key").decode()
+
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_2, TEST_KEY_1]):
+            new_encrypted, was_rotated = rotate_api_key(legacy)
+
+            assert was_rotated is True
+            assert new_encrypted.startswith(f"v2:{_key_id(TEST_KEY_2)}:")
+            assert decrypt_api_key(new_encrypted) == "legacy-key"
+
+    def test_rotate_legacy_token_already_current(self):
+        """Legacy tokens under the primary key are left as-is."""
+        legacy = Fernet(TEST_KEY_1.encode()).encrypt(b"legacy-key").decode()
+
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
+            new_encrypted, was_rotated = rotate_api_key(legacy)
+
+            assert was_rotated is False
+            assert new_encrypted == legacy
+
+
+class TestFernetCache:
+    """Tests for caching of Fernet instances."""
+
+    def test_fernet_reused_for_same_keys(self):
+        """Repeated calls with unchanged keys reuse the same instance."""
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
+            assert _get_fernet() is _get_fernet()
+
+    def test_fernet_rebuilt_when_keys_change(self):
+        """Changing the configured keys produces a new instance."""
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
+            first = _get_fernet()
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_2, TEST_KEY_1]):
+            second = _get_fernet()
+
+        assert first is not second
+
+
+class TestBytesApi:
+    """Tests for encrypt_api_key_bytes and decrypt_api_key_bytes functions."""
+
+    def test_bytes_roundtrip(self):
+        """Bytes in, bytes out, with the same v2 prefix as the str API."""
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
+            encrypted = encrypt_api_key_bytes(b"sk-or-v1-abc123")
+
+            assert isinstance(encrypted, bytes)
+            assert encrypted.startswith(f"v2:{_key_id(TEST_KEY_1)}:".encode("ascii"))
+            assert decrypt_api_key_bytes(encrypted) == b"sk-or-v1-abc123"
+
+    def test_interoperates_with_str_api(self):
+        """Ciphertexts from either API decrypt with the other."""
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
+            from_bytes = encrypt_api_key_bytes("ключ".encode("utf-8"))
+            from_str = encrypt_api_key("ключ")
+
+            assert decrypt_api_key(from_bytes.decode("ascii")) == "ключ"
+            assert decrypt_api_key_bytes(from_str.encode("ascii")) == "ключ".encode("utf-8")
+
+    def test_non_ascii_ciphertext_raises(self):
+        """A non-ASCII ciphertext string is rejected as an invalid token."""
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
+            with pytest.raises(ValueError, match="Failed to decrypt"):
+                decrypt_api_key("v2:é:token")
+
+
+class TestBatchHelpers:
+    """Tests for encrypt_api_keys and rotate_api_keys functions."""
+
+    def test_encrypt_api_keys_roundtrip(self):
+        """Each batch-encrypted key decrypts back to its original, in order."""
+        originals = ["sk-or-v1-first", "sk-or-v1-second", ""]
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
+            encrypted = encrypt_api_keys(originals)
+
+            assert [decrypt_api_key(e) for e in encrypted] == originals
+            assert all(e.startswith(f"v2:{_key_id(TEST_KEY_1)}:") for e in encrypted)
+
+    def test_rotate_api_keys_mixed(self):
+        """Only keys under an older key are re-encrypted."""
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
+            old = encrypt_api_key("old-secret")
+        with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_2, TEST_KEY_1]):
+            current = encrypt_api_key("current-secret")
+
+            results = rotate_api_keys([old, current])
+
+            assert [was_rotated for _, was_rotated in results] == [True, False]
+            assert results[1][0] == current
+            assert decrypt_api_key(results[0][0]) == "old-secret"
+
+
 class TestGetKeyHint:
     """Tests for get_key_hint function."""
 
     def test_shows_last_6_chars(self):
         """Returns last 6 characters with prefix."""
-        from backend.encryption import get_key_hint
-
         result = get_key_hint("sk-or-v1-abc123xyz")
 
         assert result == "...123xyz"
 
     def test_short_key_returns_as_is(self):
         """Keys with 6 or fewer characters returned as-is."""
-        from backend.encryption import get_key_hint
-
         assert get_key_hint("abc") == "abc"
         assert get_key_hint("123456") == "123456"
 
     def test_exactly_7_chars(self):
         """Key with 7 characters shows last 6."""
-        from backend.encryption import get_key_hint
-
         result = get_key_hint("1234567")
         assert result == "...234567"
 
+    def test_get_key_hints_matches_single(self):
+        """Batch hints match get_key_hint for each key, in order."""
+        keys = ["sk-or-v1-abc123xyz", "abc", "123456", "1234567"]
+
+        assert get_key_hints(keys) == [get_key_hint(k) for k in keys]
+        assert get_key_hints([]) == []
+
 
 class TestKeyManagement:
     """Tests for key management functions."""
@@ -168,27 +285,23 @@ class TestKeyManagement:
     def test_get_key_count_single(self):
         """Returns 1 for single key."""
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
-            from backend.encryption import get_key_count
             assert get_key_count() == 1
 
     def test_get_key_count_multiple(self):
         """Returns correct count for multiple keys."""
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1, TEST_KEY_2, TEST_KEY_3]):
-            from backend.encryption import get_key_count
             assert get_key_count() == 3
 
     def test_get_current_key_version_from_env(self):
         """Returns explicit version when set."""
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1]):
             with patch("backend.encryption.API_KEY_ENCRYPTION_KEY_VERSION", 5):
-                from backend.encryption import get_current_key_version
                 assert get_current_key_version() == 5
 
     def test_get_current_key_version_fallback(self):
         """Falls back to key count when version not set."""
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", [TEST_KEY_1, TEST_KEY_2]):
             with patch("backend.encryption.API_KEY_ENCRYPTION_KEY_VERSION", None):
-                from backend.encryption import get_current_key_version
                 assert get_current_key_version() == 2
 
 
@@ -198,8 +311,6 @@ class TestMissingConfiguration:
     def test_no_keys_configured_raises(self):
         """Raises ValueError when no encryption keys configured."""
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", []):
-            from backend.encryption import encrypt_api_key
-
             with pytest.raises(ValueError) as exc:
                 encrypt_api_key("test")
             assert "not configured" in str(exc.value)
@@ -207,8 +318,6 @@ class TestMissingConfiguration:
     def test_invalid_key_format_raises(self):
         """Raises ValueError for invalid key format."""
         with patch("backend.encryption.API_KEY_ENCRYPTION_KEYS", ["not-a-valid-fernet-key"]):
-            from backend.encryption import encrypt_api_key
-
             with pytest.raises(ValueError) as exc:
                 encrypt_api_key("test")
             assert "Invalid Fernet key" in str(exc.value)
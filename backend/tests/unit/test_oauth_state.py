@@ -5,7 +5,8 @@ Tests state token generation, validation, expiration, and PKCE code challenges.
 """
 import pytest
 import asyncio
-from datetime import datetime, timedelta, timezone
+import time
+from datetime import datetime, timezone
 from unittest.mock import patch
 
 from backend.oauth_state import (
@@ -13,12 +14,20 @@ from backend.oauth_state import (
     validate_and_consume_state,
     _generate_code_verifier,
     _generate_code_challenge,
+    _get_random_bytes,
     _oauth_states,
-    _state_lock,
+    _expiry_heap,
+    ENTROPY_BATCH_SIZE,
     STATE_TTL_SECONDS,
 )
 
 
+def _clear_state_store():
+    """Empty the state store and the expiry heap."""
+    _oauth_states.clear()
+    _expiry_heap.clear()
+
+
 class TestPKCEGeneration:
     """Tests for PKCE code verifier and challenge generation."""
 
@@ -32,6 +41,15 @@ class TestPKCEGeneration:
         verifiers = [_generate_code_verifier() for _ in range(100)]
         assert len(set(verifiers)) == 100
 
+    def test_generate_code_verifier_from_raw_bytes(self):
+        """Pre-drawn bytes are encoded as-is, without padding."""
+        assert _generate_code_verifier(b"\x00" * 32) == "A" * 43
+
+    def test_get_random_bytes_larger_than_batch(self):
+        """Requests bigger than a refill batch still get every byte."""
+        n = 32 * ENTROPY_BATCH_SIZE + 100
+        assert len(_get_random_bytes(n)) == n
+
     def test_generate_code_verifier_url_safe(self):
         """Code verifier contains only URL-safe characters."""
         verifier = _generate_code_verifier()
@@ -64,13 +82,11 @@ class TestOAuthStateCreation:
     """Tests for OAuth state token creation."""
 
     @pytest.fixture(autouse=True)
-    async def clear_state_store(self):
+    def clear_state_store(self):
         """Clear the state store before each test."""
-        async with _state_lock:
-            _oauth_states.clear()
+        _clear_state_store()
         yield
-        async with _state_lock:
-            _oauth_states.clear()
+        _clear_state_store()
 
     @pytest.mark.asyncio
     async def test_create_oauth_state_returns_tuple(self):
@@ -91,18 +107,26 @@ class TestOAuthStateCreation:
         """Created state is stored in memory."""
         state, _ = await create_oauth_state()
 
-        async with _state_lock:
-            assert state in _oauth_states
+        assert state in _oauth_states
 
     @pytest.mark.asyncio
     async def test_create_oauth_state_stores_verifier(self):
         """State storage includes code verifier."""
         state, _ = await create_oauth_state()
 
-        async with _state_lock:
-            state_data = _oauth_states[state]
-            assert state_data.code_verifier is not None
-            assert len(state_data.code_verifier) > 0
+        state_data = _oauth_states[state]
+        assert state_data.code_verifier is not None
+        assert len(state_data.code_verifier) > 0
+
+    @pytest.mark.asyncio
+    async def test_create_oauth_state_state_and_verifier_independent(self):
+        """State and verifier are separate 43-character tokens."""
+        state, _ = await create_oauth_state()
+
+        verifier = _oauth_states[state].code_verifier
+        assert len(state) == 43
+        assert len(verifier) == 43
+        assert state != verifier
 
     @pytest.mark.asyncio
     async def test_create_oauth_state_records_timestamp(self):
@@ -111,22 +135,19 @@ class TestOAuthStateCreation:
         state, _ = await create_oauth_state()
         after = datetime.now(timezone.utc)
 
-        async with _state_lock:
-            state_data = _oauth_states[state]
-            assert before <= state_data.created_at <= after
+        state_data = _oauth_states[state]
+        assert before <= state_data.created_at <= after
 
 
 class TestOAuthStateValidation:
     """Tests for OAuth state validation and consumption."""
 
     @pytest.fixture(autouse=True)
-    async def clear_state_store(self):
+    def clear_state_store(self):
         """Clear the state store before each test."""
-        async with _state_lock:
-            _oauth_states.clear()
+        _clear_state_store()
         yield
-        async with _state_lock:
-            _oauth_states.clear()
+        _clear_state_store()
 
     @pytest.mark.asyncio
     async def test_validate_valid_state_returns_verifier(self):
@@ -134,8 +155,7 @@ class TestOAuthStateValidation:
         state, _ = await create_oauth_state()
 
         # Get expected verifier before validation
-        async with _state_lock:
-            expected_verifier = _oauth_states[state].code_verifier
+        expected_verifier = _oauth_states[state].code_verifier
 
         result = await validate_and_consume_state(state)
         assert result == expected_verifier
@@ -147,8 +167,7 @@ class TestOAuthStateValidation:
 
         await validate_and_consume_state(state)
 
-        async with _state_lock:
-            assert state not in _oauth_states
+        assert state not in _oauth_states
 
     @pytest.mark.asyncio
     async def test_validate_invalid_state_returns_none(self):
@@ -186,13 +205,11 @@ class TestOAuthStateExpiration:
     """Tests for OAuth state expiration."""
 
     @pytest.fixture(autouse=True)
-    async def clear_state_store(self):
+    def clear_state_store(self):
         """Clear the state store before each test."""
-        async with _state_lock:
-            _oauth_states.clear()
+        _clear_state_store()
         yield
-        async with _state_lock:
-            _oauth_states.clear()
+        _clear_state_store()
 
     @pytest.mark.asyncio
     async def test_expired_state_returns_none(self):
@@ -200,10 +217,7 @@ class TestOAuthStateExpiration:
         state, _ = await create_oauth_state()
 
         # Manually expire the state
-        async with _state_lock:
-            _oauth_states[state].created_at = (
-                datetime.now(timezone.utc) - timedelta(seconds=STATE_TTL_SECONDS + 1)
-            )
+        _oauth_states[state].created_at_mono -= STATE_TTL_SECONDS + 1
 
         result = await validate_and_consume_state(state)
         assert result is None
@@ -214,10 +228,7 @@ class TestOAuthStateExpiration:
         state, _ = await create_oauth_state()
 
         # Set to just under TTL
-        async with _state_lock:
-            _oauth_states[state].created_at = (
-                datetime.now(timezone.utc) - timedelta(seconds=STATE_TTL_SECONDS - 1)
-            )
+        _oauth_states[state].created_at_mono -= STATE_TTL_SECONDS - 1
 
         result = await validate_and_consume_state(state)
         assert result is not None
@@ -225,31 +236,35 @@ class TestOAuthStateExpiration:
     @pytest.mark.asyncio
     async def test_cleanup_removes_expired_states(self):
         """Creating new state cleans up expired states."""
-        # Create an expired state
         old_state, _ = await create_oauth_state()
-        async with _state_lock:
-            _oauth_states[old_state].created_at = (
-                datetime.now(timezone.utc) - timedelta(seconds=STATE_TTL_SECONDS + 100)
-            )
 
-        # Create a new state (triggers cleanup)
+        # Create a new state after the old one expired (triggers cleanup)
+        later = time.monotonic() + STATE_TTL_SECONDS + 100
+        with patch("backend.oauth_state._monotonic", return_value=later):
+            new_state, _ = await create_oauth_state()
+
+        assert old_state not in _oauth_states
+        assert new_state in _oauth_states
+
+    @pytest.mark.asyncio
+    async def test_cleanup_keeps_unexpired_states(self):
+        """Cleanup leaves states that are still within their TTL."""
+        state, _ = await create_oauth_state()
+
         await create_oauth_state()
 
-        async with _state_lock:
-            assert old_state not in _oauth_states
+        assert state in _oauth_states
 
 
 class TestConcurrency:
     """Tests for concurrent access to OAuth state store."""
 
     @pytest.fixture(autouse=True)
-    async def clear_state_store(self):
+    def clear_state_store(self):
         """Clear the state store before each test."""
-        async with _state_lock:
-            _oauth_states.clear()
+        _clear_state_store()
         yield
-        async with _state_lock:
-            _oauth_states.clear()
+        _clear_state_store()
 
     @pytest.mark.asyncio
     async def test_concurrent_state_creation(self):
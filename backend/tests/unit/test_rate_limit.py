@@ -4,11 +4,22 @@ Unit tests for backend.rate_limit module.
 Tests rate limiting logic with sliding window algorithm.
 """
 import pytest
-from datetime import datetime, timedelta, timezone
-from freezegun import freeze_time
 from fastapi import HTTPException
 
-from backend.rate_limit import RateLimiter
+from backend.rate_limit import RateLimiter, EVICTIONS_PER_CHECK, WINDOW_SECONDS
+
+
+class FakeClock:
+    """Manually advanced stand-in for time.monotonic."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
 
 
 class TestRateLimiterCheck:
@@ -40,6 +51,23 @@ class TestRateLimiterCheck:
         assert "Rate limit exceeded" in exc.value.detail
         assert "3 requests per minute" in exc.value.detail
 
+    @pytest.mark.asyncio
+    async def test_zero_limit_blocks_every_request(self):
+        """A limit of 0 rejects every request with 429, even after eviction."""
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=0, clock=clock)
+
+        with pytest.raises(HTTPException) as exc:
+            await limiter.check("user-1")
+        assert exc.value.status_code == 429
+
+        # user-1's eviction entry is now due and its ring is empty
+        clock.advance(WINDOW_SECONDS + 1)
+        with pytest.raises(HTTPException) as exc:
+            await limiter.check("user-2")
+        assert exc.value.status_code == 429
+        assert "user-1" not in limiter._requests
+
     @pytest.mark.asyncio
     async def test_different_users_have_separate_limits(self):
         """Each user has their own rate limit."""
@@ -60,51 +88,51 @@ class TestRateLimiterCheck:
     @pytest.mark.asyncio
     async def test_resets_after_window_expires(self):
         """Limit resets after sliding window passes."""
-        limiter = RateLimiter(requests_per_minute=2)
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=2, clock=clock)
 
-        with freeze_time("2026-01-05 12:00:00") as frozen:
-            # Use up the limit
-            await limiter.check("user-1")
-            await limiter.check("user-1")
+        # Use up the limit
+        await limiter.check("user-1")
+        await limiter.check("user-1")
 
-            # Blocked
-            with pytest.raises(HTTPException):
-                await limiter.check("user-1")
+        # Blocked
+        with pytest.raises(HTTPException):
+            await limiter.check("user-1")
 
-            # Move time forward 61 seconds (past the 1 minute window)
-            frozen.move_to("2026-01-05 12:01:01")
+        # Move time forward 61 seconds (past the 1 minute window)
+        clock.advance(61)
 
-            # Should be allowed again
-            await limiter.check("user-1")
+        # Should be allowed again
+        await limiter.check("user-1")
 
     @pytest.mark.asyncio
     async def test_sliding_window_partial_reset(self):
         """Old requests fall out of window while newer ones remain."""
-        limiter = RateLimiter(requests_per_minute=3)
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=3, clock=clock)
 
-        with freeze_time("2026-01-05 12:00:00") as frozen:
-            # Make request at T+0
-            await limiter.check("user-1")
+        # Make request at T+0
+        await limiter.check("user-1")
 
-            # Make 2 more at T+30s
-            frozen.move_to("2026-01-05 12:00:30")
-            await limiter.check("user-1")
+        # Make 2 more at T+30s
+        clock.advance(30)
+        await limiter.check("user-1")
+        await limiter.check("user-1")
+
+        # Blocked at T+30s (3 requests in last minute)
+        with pytest.raises(HTTPException):
             await limiter.check("user-1")
 
-            # Blocked at T+30s (3 requests in last minute)
-            with pytest.raises(HTTPException):
-                await limiter.check("user-1")
+        # At T+61s, the first request expires but the T+30s ones remain
+        clock.advance(31)
 
-            # At T+61s, the first request expires but the T+30s ones remain
-            frozen.move_to("2026-01-05 12:01:01")
+        # Should allow 1 more (2 from T+30s still count)
+        await limiter.check("user-1")
 
-            # Should allow 1 more (2 from T+30s still count)
+        # Blocked again
+        with pytest.raises(HTTPException):
             await limiter.check("user-1")
 
-            # Blocked again
-            with pytest.raises(HTTPException):
-                await limiter.check("user-1")
-
 
 class TestRateLimiterGetRemaining:
     """Tests for RateLimiter.get_remaining() method."""
@@ -160,43 +188,57 @@ class TestRateLimiterCleanup:
 
     @pytest.mark.asyncio
     async def test_cleanup_removes_expired_entries(self):
-        """Cleanup removes entries older than 1 minute."""
-        limiter = RateLimiter(requests_per_minute=10, cleanup_interval=0)  # Cleanup every time
+        """Cleanup removes users whose requests are older than 1 minute."""
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=10, clock=clock)
 
-        with freeze_time("2026-01-05 12:00:00") as frozen:
-            await limiter.check("user-1")
+        await limiter.check("user-1")
 
-            # Move past expiration
-            frozen.move_to("2026-01-05 12:02:00")
+        # Move past expiration
+        clock.advance(120)
 
-            # Trigger cleanup via check
-            await limiter.check("user-2")
+        # Trigger cleanup via check
+        await limiter.check("user-2")
 
-            # User 1's entry should be cleaned up
-            remaining = await limiter.get_remaining("user-1")
-            assert remaining == 10
+        # User 1's entry should be cleaned up
+        assert "user-1" not in limiter._requests
+        remaining = await limiter.get_remaining("user-1")
+        assert remaining == 10
 
     @pytest.mark.asyncio
-    async def test_cleanup_interval_respected(self):
-        """Cleanup only happens after cleanup_interval seconds."""
-        # Create limiter with 60 second cleanup interval
-        limiter = RateLimiter(requests_per_minute=10, cleanup_interval=60)
+    async def test_cleanup_keeps_active_users(self):
+        """Users with a request inside the window are not evicted."""
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=10, clock=clock)
 
-        with freeze_time("2026-01-05 12:00:00") as frozen:
-            await limiter.check("user-1")
+        await limiter.check("user-1")
 
-            # Move only 30 seconds (less than cleanup interval)
-            frozen.move_to("2026-01-05 12:00:30")
+        # Another request keeps user 1 active past its first expiry
+        clock.advance(50)
+        await limiter.check("user-1")
 
-            # Cleanup should not have run yet, so internal state still has old entries
-            # (even though they're expired, they haven't been cleaned up)
-            # This is an implementation detail test
+        clock.advance(20)
+        await limiter.check("user-2")
 
-            # Move to just past cleanup interval
-            frozen.move_to("2026-01-05 12:01:01")
+        assert "user-1" in limiter._requests
+        assert await limiter.get_remaining("user-1") == 9
 
-            # Now cleanup should run on next check
-            await limiter.check("user-2")
+    @pytest.mark.asyncio
+    async def test_cleanup_is_incremental(self):
+        """Each check evicts at most EVICTIONS_PER_CHECK idle users."""
+        clock = FakeClock()
+        limiter = RateLimiter(requests_per_minute=10, clock=clock)
+
+        for i in range(20):
+            await limiter.check(f"user-{i}")
+
+        clock.advance(120)
+
+        await limiter.check("new-user")
+        assert len(limiter._requests) == 20 - EVICTIONS_PER_CHECK + 1
+
+        await limiter.check("new-user")
+        assert len(limiter._requests) == 20 - 2 * EVICTIONS_PER_CHECK + 1
 
 
 class TestRateLimiterConcurrency:
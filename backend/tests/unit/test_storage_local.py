@@ -1,237 +1,231 @@
 """
 Unit tests for backend.storage_local module.
 
-Tests local JSON-based storage with isolated temp directories.
+Tests local JSON-based storage. Most tests run against an in-memory double
+of the file helpers; TestDiskPersistence covers the real JSON files.
 """
+import asyncio
+import json
 import pytest
-from uuid import uuid4
+from types import SimpleNamespace
+from uuid import UUID
 from pathlib import Path
 
 
-class TestConversations:
-    """Tests for conversation CRUD operations."""
+# Fixed owner for parametrized cases: parameters are built at collection
+# time, before uid exists. uid() counts from 1, so this never clashes.
+_USER_ID = UUID(int=0)
 
-    @pytest.mark.asyncio
-    async def test_create_conversation(self, isolated_storage):
-        """Create a conversation and verify structure."""
-        conv_id = str(uuid4())
-        result = await isolated_storage.create_conversation(conv_id)
 
-        assert result["id"] == conv_id
-        assert result["title"] == "New Conversation"
-        assert result["messages"] == []
-        assert "created_at" in result
-        assert "models" in result
-        assert "lead_model" in result
-
-    @pytest.mark.asyncio
-    async def test_create_conversation_with_models(self, isolated_storage):
-        """Create conversation with custom model selection."""
-        conv_id = str(uuid4())
-        models = ["openai/gpt-4", "anthropic/claude-3"]
-        lead = "openai/gpt-4"
-
-        result = await isolated_storage.create_conversation(
-            conv_id, models=models, lead_model=lead
-        )
+@pytest.fixture
+async def conv(memory_storage, uid):
+    """A freshly created conversation, as (conversation_id, record)."""
+    conv_id = str(uid())
+    return conv_id, await memory_storage.create_conversation(conv_id)
 
-        assert result["models"] == models
-        assert result["lead_model"] == lead
 
-    @pytest.mark.asyncio
-    async def test_create_conversation_with_user(self, isolated_storage):
-        """Create conversation with user_id."""
-        conv_id = str(uuid4())
-        user_id = uuid4()
+class TestConversations:
+    """Tests for conversation CRUD operations."""
 
-        result = await isolated_storage.create_conversation(conv_id, user_id=user_id)
+    @pytest.mark.parametrize("kwargs, expected", [
+        ({}, {"title": "New Conversation", "messages": []}),
+        (
+            {"models": ["openai/gpt-4", "anthropic/claude-3"], "lead_model": "openai/gpt-4"},
+            {"models": ["openai/gpt-4", "anthropic/claude-3"], "lead_model": "openai/gpt-4"},
+        ),
+        ({"user_id": _USER_ID}, {"user_id": str(_USER_ID)}),
+    ], ids=[
+        "defaults",
+        "with_models",
+        "with_user",
+    ])
+    async def test_create_conversation(self, memory_storage, kwargs, expected, uid):
+        """Create a conversation and verify structure."""
+        conv_id = str(uid())
 
-        assert result["user_id"] == str(user_id)
+        result = await memory_storage.create_conversation(conv_id, **kwargs)
 
-    @pytest.mark.asyncio
-    async def test_get_conversation(self, isolated_storage):
+        assert result["id"] == conv_id
+        assert {key: result[key] for key in expected} == expected
+        assert {"created_at", "models", "lead_model"} <= result.keys()
+
+    async def test_bulk_create_conversations(self, memory_storage, uid):
+        """Bulk creation returns each conversation, in order, and stores them."""
+        user_id = uid()
+        specs = [
+            {"conversation_id": str(uid())},
+            {"conversation_id": str(uid()), "user_id": user_id, "models": ["openai/gpt-4"]},
+        ]
+
+        result = await memory_storage.bulk_create_conversations(specs)
+
+        assert [c["id"] for c in result] == [spec["conversation_id"] for spec in specs]
+        assert result[1]["user_id"] == str(user_id)
+        assert result[1]["models"] == ["openai/gpt-4"]
+        for spec in specs:
+            assert await memory_storage.get_conversation(spec["conversation_id"]) is not None
+
+    async def test_get_conversation(self, memory_storage, conv):
         """Get existing conversation."""
-        conv_id = str(uuid4())
-        await isolated_storage.create_conversation(conv_id)
+        conv_id, _ = conv
 
-        result = await isolated_storage.get_conversation(conv_id)
+        result = await memory_storage.get_conversation(conv_id)
 
         assert result is not None
         assert result["id"] == conv_id
 
-    @pytest.mark.asyncio
-    async def test_get_conversation_not_found(self, isolated_storage):
+    async def test_get_conversation_not_found(self, memory_storage):
         """Get non-existent conversation returns None."""
-        result = await isolated_storage.get_conversation("nonexistent")
+        result = await memory_storage.get_conversation("nonexistent")
 
         assert result is None
 
-    @pytest.mark.asyncio
-    async def test_get_conversation_user_filter(self, isolated_storage):
+    async def test_get_conversation_user_filter(self, memory_storage, uid):
         """Get conversation filtered by user_id."""
-        conv_id = str(uuid4())
-        user_id = uuid4()
-        other_user = uuid4()
+        conv_id = str(uid())
+        user_id = uid()
+        other_user = uid()
 
-        await isolated_storage.create_conversation(conv_id, user_id=user_id)
+        await memory_storage.create_conversation(conv_id, user_id=user_id)
 
         # Owner can access
-        result = await isolated_storage.get_conversation(conv_id, user_id=user_id)
+        result = await memory_storage.get_conversation(conv_id, user_id=user_id)
         assert result is not None
 
         # Other user cannot access
-        result = await isolated_storage.get_conversation(conv_id, user_id=other_user)
+        result = await memory_storage.get_conversation(conv_id, user_id=other_user)
         assert result is None
 
-    @pytest.mark.asyncio
-    async def test_list_conversations(self, isolated_storage):
+    async def test_list_conversations(self, memory_storage, uid):
         """List all conversations (only those with messages)."""
         # Create a few conversations with messages
-        ids = [str(uuid4()) for _ in range(3)]
-        for conv_id in ids:
-            await isolated_storage.create_conversation(conv_id)
-            await isolated_storage.add_user_message(conv_id, "Hello")
+        ids = [str(uid()) for _ in range(3)]
+        async with memory_storage.batch():
+            await memory_storage.bulk_create_conversations(
+                [{"conversation_id": conv_id} for conv_id in ids]
+            )
+            await asyncio.gather(
+                *(memory_storage.add_user_message(conv_id, "Hello") for conv_id in ids)
+            )
 
-        result = await isolated_storage.list_conversations()
+        result = await memory_storage.list_conversations()
 
-        # Only conversations with messages should be listed
-        assert len(result) == 3
-        result_ids = [c["id"] for c in result]
-        for conv_id in ids:
-            assert conv_id in result_ids
+        # Only conversations with messages are listed, most recent first
+        assert [c["id"] for c in result] == ids[::-1]
 
-    @pytest.mark.asyncio
-    async def test_list_conversations_user_filter(self, isolated_storage):
+    async def test_list_conversations_user_filter(self, memory_storage, uid):
         """List conversations filtered by user_id (only those with messages)."""
-        user_id = uuid4()
-        other_user = uuid4()
+        user_id = uid()
+        other_user = uid()
 
         # Create 2 for user, 1 for other (with messages so they're not filtered)
-        conv1 = str(uuid4())
-        await isolated_storage.create_conversation(conv1, user_id=user_id)
-        await isolated_storage.add_user_message(conv1, "Hello")
-
-        conv2 = str(uuid4())
-        await isolated_storage.create_conversation(conv2, user_id=user_id)
-        await isolated_storage.add_user_message(conv2, "Hello")
-
-        conv3 = str(uuid4())
-        await isolated_storage.create_conversation(conv3, user_id=other_user)
-        await isolated_storage.add_user_message(conv3, "Hello")
+        async with memory_storage.batch():
+            for owner in (user_id, user_id, other_user):
+                conv_id = str(uid())
+                await memory_storage.create_conversation(conv_id, user_id=owner)
+                await memory_storage.add_user_message(conv_id, "Hello")
 
         # User sees only their 2
-        result = await isolated_storage.list_conversations(user_id=user_id)
+        result = await memory_storage.list_conversations(user_id=user_id)
         assert len(result) == 2
 
         # Other user sees only their 1
-        result = await isolated_storage.list_conversations(user_id=other_user)
+        result = await memory_storage.list_conversations(user_id=other_user)
         assert len(result) == 1
 
-    @pytest.mark.asyncio
-    async def test_list_conversations_filters_empty(self, isolated_storage):
+    async def test_list_conversations_filters_empty(self, memory_storage, uid):
         """Verify that empty conversations are not listed."""
         # Create conversation without messages (should be filtered out)
-        empty_conv = str(uuid4())
-        await isolated_storage.create_conversation(empty_conv)
+        empty_conv = str(uid())
+        await memory_storage.create_conversation(empty_conv)
 
         # Create conversation with messages (should be listed)
-        conv_with_msg = str(uuid4())
-        await isolated_storage.create_conversation(conv_with_msg)
-        await isolated_storage.add_user_message(conv_with_msg, "Hello")
+        conv_with_msg = str(uid())
+        await memory_storage.create_conversation(conv_with_msg)
+        await memory_storage.add_user_message(conv_with_msg, "Hello")
 
-        result = await isolated_storage.list_conversations()
+        result = await memory_storage.list_conversations()
 
         # Only the conversation with messages should appear
         assert len(result) == 1
         assert result[0]["id"] == conv_with_msg
 
-    @pytest.mark.asyncio
-    async def test_add_user_message(self, isolated_storage):
+    async def test_add_user_message(self, memory_storage, conv):
         """Add user message to conversation."""
-        conv_id = str(uuid4())
-        await isolated_storage.create_conversation(conv_id)
+        conv_id, _ = conv
 
-        message_order = await isolated_storage.add_user_message(conv_id, "Hello!")
+        message_order = await memory_storage.add_user_message(conv_id, "Hello!")
 
         assert message_order == 0
 
-        conv = await isolated_storage.get_conversation(conv_id)
+        conv = await memory_storage.get_conversation(conv_id)
         assert len(conv["messages"]) == 1
         assert conv["messages"][0]["role"] == "user"
         assert conv["messages"][0]["content"] == "Hello!"
 
-    @pytest.mark.asyncio
-    async def test_add_assistant_message(self, isolated_storage):
+    async def test_add_assistant_message(self, memory_storage, conv):
         """Add assistant message with all stages."""
-        conv_id = str(uuid4())
-        await isolated_storage.create_conversation(conv_id)
+        conv_id, _ = conv
 
         stage1 = [{"model": "gpt-4", "response": "Response 1"}]
         stage2 = [{"model": "claude", "ranking": "1. A\n2. B"}]
         stage3 = {"content": "Final synthesis"}
 
-        await isolated_storage.add_assistant_message(conv_id, stage1, stage2, stage3)
+        await memory_storage.add_assistant_message(conv_id, stage1, stage2, stage3)
 
-        conv = await isolated_storage.get_conversation(conv_id)
+        conv = await memory_storage.get_conversation(conv_id)
         assert len(conv["messages"]) == 1
         assert conv["messages"][0]["role"] == "assistant"
         assert conv["messages"][0]["stage1"] == stage1
         assert conv["messages"][0]["stage2"] == stage2
         assert conv["messages"][0]["stage3"] == stage3
 
-    @pytest.mark.asyncio
-    async def test_update_conversation_title(self, isolated_storage):
+    async def test_update_conversation_title(self, memory_storage, conv):
         """Update conversation title."""
-        conv_id = str(uuid4())
-        await isolated_storage.create_conversation(conv_id)
+        conv_id, _ = conv
 
-        await isolated_storage.update_conversation_title(conv_id, "New Title")
+        await memory_storage.update_conversation_title(conv_id, "New Title")
 
-        conv = await isolated_storage.get_conversation(conv_id)
+        conv = await memory_storage.get_conversation(conv_id)
         assert conv["title"] == "New Title"
 
-    @pytest.mark.asyncio
-    async def test_delete_conversation(self, isolated_storage):
+    async def test_delete_conversation(self, memory_storage, conv):
         """Delete a conversation."""
-        conv_id = str(uuid4())
-        await isolated_storage.create_conversation(conv_id)
+        conv_id, _ = conv
 
-        result = await isolated_storage.delete_conversation(conv_id)
+        result = await memory_storage.delete_conversation(conv_id)
 
         assert result is True
-        assert await isolated_storage.get_conversation(conv_id) is None
+        assert await memory_storage.get_conversation(conv_id) is None
 
-    @pytest.mark.asyncio
-    async def test_delete_conversation_not_found(self, isolated_storage):
+    async def test_delete_conversation_not_found(self, memory_storage):
         """Delete non-existent conversation returns False."""
-        result = await isolated_storage.delete_conversation("nonexistent")
+        result = await memory_storage.delete_conversation("nonexistent")
 
         assert result is False
 
-    @pytest.mark.asyncio
-    async def test_delete_conversation_wrong_user(self, isolated_storage):
+    async def test_delete_conversation_wrong_user(self, memory_storage, uid):
         """Cannot delete another user's conversation."""
-        conv_id = str(uuid4())
-        user_id = uuid4()
-        other_user = uuid4()
+        conv_id = str(uid())
+        user_id = uid()
+        other_user = uid()
 
-        await isolated_storage.create_conversation(conv_id, user_id=user_id)
+        await memory_storage.create_conversation(conv_id, user_id=user_id)
 
         # Other user cannot delete
-        result = await isolated_storage.delete_conversation(conv_id, user_id=other_user)
+        result = await memory_storage.delete_conversation(conv_id, user_id=other_user)
         assert result is False
 
         # Conversation still exists
-        assert await isolated_storage.get_conversation(conv_id) is not None
+        assert await memory_storage.get_conversation(conv_id) is not None
 
 
 class TestUsers:
     """Tests for user management."""
 
-    @pytest.mark.asyncio
-    async def test_create_user(self, isolated_storage):
+    async def test_create_user(self, memory_storage):
         """Create a user."""
-        result = await isolated_storage.create_user(
+        result = await memory_storage.create_user(
             email="test@example.com",
             password_hash="hashed_password"
         )
@@ -241,40 +235,36 @@ class TestUsers:
         assert "id" in result
         assert "created_at" in result
 
-    @pytest.mark.asyncio
-    async def test_get_user_by_email(self, isolated_storage):
+    async def test_get_user_by_email(self, memory_storage):
         """Get user by email (case insensitive)."""
-        await isolated_storage.create_user(
+        await memory_storage.create_user(
             email="Test@Example.com",
             password_hash="hash"
         )
 
         # Find by lowercase
-        result = await isolated_storage.get_user_by_email("test@example.com")
+        result = await memory_storage.get_user_by_email("test@example.com")
         assert result is not None
         assert result["email"] == "Test@Example.com"
 
         # Find by uppercase
-        result = await isolated_storage.get_user_by_email("TEST@EXAMPLE.COM")
+        result = await memory_storage.get_user_by_email("TEST@EXAMPLE.COM")
         assert result is not None
 
-    @pytest.mark.asyncio
-    async def test_get_user_by_email_not_found(self, isolated_storage):
+    async def test_get_user_by_email_not_found(self, memory_storage):
         """Get non-existent user returns None."""
-        result = await isolated_storage.get_user_by_email("nonexistent@example.com")
+        result = await memory_storage.get_user_by_email("nonexistent@example.com")
 
         assert result is None
 
-    @pytest.mark.asyncio
-    async def test_get_user_by_id(self, isolated_storage):
+    async def test_get_user_by_id(self, memory_storage):
         """Get user by ID."""
-        created = await isolated_storage.create_user(
+        created = await memory_storage.create_user(
             email="test@example.com",
             password_hash="hash"
         )
 
-        from uuid import UUID
-        result = await isolated_storage.get_user_by_id(UUID(created["id"]))
+        result = await memory_storage.get_user_by_id(UUID(created["id"]))
 
         assert result is not None
         assert result["email"] == "test@example.com"
@@ -283,10 +273,9 @@ class TestUsers:
 class TestOAuthUsers:
     """Tests for OAuth user management."""
 
-    @pytest.mark.asyncio
-    async def test_create_oauth_user(self, isolated_storage):
+    async def test_create_oauth_user(self, memory_storage):
         """Create an OAuth user."""
-        result = await isolated_storage.create_oauth_user(
+        result = await memory_storage.create_oauth_user(
             email="oauth@example.com",
             oauth_provider="google",
             oauth_provider_id="google-123",
@@ -300,38 +289,34 @@ class TestOAuthUsers:
         assert result["name"] == "OAuth User"
         assert result["avatar_url"] == "https://example.com/avatar.png"
 
-    @pytest.mark.asyncio
-    async def test_get_user_by_oauth(self, isolated_storage):
+    async def test_get_user_by_oauth(self, memory_storage):
         """Get user by OAuth credentials."""
-        await isolated_storage.create_oauth_user(
+        await memory_storage.create_oauth_user(
             email="oauth@example.com",
             oauth_provider="github",
             oauth_provider_id="gh-456"
         )
 
-        result = await isolated_storage.get_user_by_oauth("github", "gh-456")
+        result = await memory_storage.get_user_by_oauth("github", "gh-456")
 
         assert result is not None
         assert result["email"] == "oauth@example.com"
 
-    @pytest.mark.asyncio
-    async def test_get_user_by_oauth_not_found(self, isolated_storage):
+    async def test_get_user_by_oauth_not_found(self, memory_storage):
         """Non-existent OAuth user returns None."""
-        result = await isolated_storage.get_user_by_oauth("google", "nonexistent")
+        result = await memory_storage.get_user_by_oauth("google", "nonexistent")
 
         assert result is None
 
-    @pytest.mark.asyncio
-    async def test_link_oauth_to_existing_user(self, isolated_storage):
+    async def test_link_oauth_to_existing_user(self, memory_storage):
         """Link OAuth credentials to existing user."""
         # Create regular user first
-        user = await isolated_storage.create_user(
+        user = await memory_storage.create_user(
             email="user@example.com",
             password_hash="hash"
         )
 
-        from uuid import UUID
-        result = await isolated_storage.link_oauth_to_existing_user(
+        result = await memory_storage.link_oauth_to_existing_user(
             user_id=UUID(user["id"]),
             oauth_provider="google",
             oauth_provider_id="google-789",
@@ -345,7 +330,7 @@ class TestOAuthUsers:
         assert result["name"] == "Updated Name"
 
         # Should be findable by OAuth now
-        found = await isolated_storage.get_user_by_oauth("google", "google-789")
+        found = await memory_storage.get_user_by_oauth("google", "google-789")
         assert found is not None
         assert found["id"] == user["id"]
 
@@ -353,61 +338,50 @@ class TestOAuthUsers:
 class TestApiKeys:
     """Tests for API key management."""
 
-    @pytest.mark.asyncio
-    async def test_save_and_get_api_key(self, isolated_storage):
-        """Save and retrieve an API key."""
-        from unittest.mock import patch
+    @pytest.fixture(autouse=True)
+    def fake_encryption(self, memory_storage, monkeypatch):
+        """Swap in stub encryption functions through storage_local's seam."""
+        monkeypatch.setattr(memory_storage, "_encryption", SimpleNamespace(
+            get_current_key_version=lambda: 1,
+            decrypt_api_key=lambda *_: "decrypted-key",
+            rotate_api_key=lambda *_: ("encrypted", False),
+        ))
 
-        user_id = uuid4()
-
-        # Mock encryption functions (imported inside the functions)
-        with patch("backend.encryption.get_current_key_version", return_value=1):
-            with patch("backend.encryption.decrypt_api_key", return_value="decrypted-key"):
-                with patch("backend.encryption.rotate_api_key", return_value=("encrypted", False)):
-                    await isolated_storage.save_user_api_key(
-                        user_id=user_id,
-                        provider="openrouter",
-                        encrypted_key="encrypted-key",
-                        key_hint="...xyz"
-                    )
+    async def test_save_and_get_api_key(self, memory_storage, user_id):
+        """Save and retrieve an API key."""
+        await memory_storage.save_user_api_key(
+            user_id=user_id,
+            provider="openrouter",
+            encrypted_key="encrypted-key",
+            key_hint="...xyz"
+        )
 
-                    result = await isolated_storage.get_user_api_key(user_id, "openrouter")
+        result = await memory_storage.get_user_api_key(user_id, "openrouter")
 
         assert result == "decrypted-key"
 
-    @pytest.mark.asyncio
-    async def test_get_api_key_not_found(self, isolated_storage):
+    async def test_get_api_key_not_found(self, memory_storage, uid):
         """Get non-existent API key returns None."""
-        from unittest.mock import patch
-
-        with patch("backend.encryption.decrypt_api_key"):
-            with patch("backend.encryption.get_current_key_version", return_value=1):
-                result = await isolated_storage.get_user_api_key(uuid4(), "openrouter")
+        result = await memory_storage.get_user_api_key(uid(), "openrouter")
 
         assert result is None
 
-    @pytest.mark.asyncio
-    async def test_list_user_api_keys(self, isolated_storage):
+    async def test_list_user_api_keys(self, memory_storage, user_id):
         """List user's API keys (metadata only)."""
-        from unittest.mock import patch
-
-        user_id = uuid4()
-
-        with patch("backend.encryption.get_current_key_version", return_value=1):
-            await isolated_storage.save_user_api_key(
-                user_id=user_id,
-                provider="openrouter",
-                encrypted_key="encrypted",
-                key_hint="...abc"
-            )
-            await isolated_storage.save_user_api_key(
-                user_id=user_id,
-                provider="anthropic",
-                encrypted_key="encrypted2",
-                key_hint="...xyz"
-            )
+        await memory_storage.save_user_api_key(
+            user_id=user_id,
+            provider="openrouter",
+            encrypted_key="encrypted",
+            key_hint="...abc"
+        )
+        await memory_storage.save_user_api_key(
+            user_id=user_id,
+            provider="anthropic",
+            encrypted_key="encrypted2",
+            key_hint="...xyz"
+        )
 
-        result = await isolated_storage.get_user_api_keys(user_id)
+        result = await memory_storage.get_user_api_keys(user_id)
 
         assert len(result) == 2
         providers = [k["provider"] for k in result]
@@ -417,46 +391,36 @@ class TestApiKeys:
         for key_data in result:
             assert "encrypted_key" not in key_data
 
-    @pytest.mark.asyncio
-    async def test_delete_api_key(self, isolated_storage):
+    async def test_delete_api_key(self, memory_storage, user_id):
         """Delete an API key."""
-        from unittest.mock import patch
-
-        user_id = uuid4()
-
-        with patch("backend.encryption.get_current_key_version", return_value=1):
-            await isolated_storage.save_user_api_key(
-                user_id=user_id,
-                provider="openrouter",
-                encrypted_key="encrypted",
-                key_hint="...abc"
-            )
+        await memory_storage.save_user_api_key(
+            user_id=user_id,
+            provider="openrouter",
+            encrypted_key="encrypted",
+            key_hint="...abc"
+        )
 
-        result = await isolated_storage.delete_user_api_key(user_id, "openrouter")
+        result = await memory_storage.delete_user_api_key(user_id, "openrouter")
 
         assert result is True
 
         # Should be gone
-        keys = await isolated_storage.get_user_api_keys(user_id)
+        keys = await memory_storage.get_user_api_keys(user_id)
         assert len(keys) == 0
 
 
 class TestCredits:
     """Tests for credits system stubs."""
 
-    @pytest.mark.asyncio
-    async def test_get_user_credits_default(self, isolated_storage):
+    async def test_get_user_credits_default(self, memory_storage, uid):
         """New user has 0 credits."""
-        result = await isolated_storage.get_user_credits(uuid4())
+        result = await memory_storage.get_user_credits(uid())
 
         assert result == 0
 
-    @pytest.mark.asyncio
-    async def test_add_credits(self, isolated_storage):
+    async def test_add_credits(self, memory_storage, user_id):
         """Add credits to user."""
-        user_id = uuid4()
-
-        result = await isolated_storage.add_credits(
+        result = await memory_storage.add_credits(
             user_id=user_id,
             amount=10,
             transaction_type="purchase",
@@ -466,44 +430,36 @@ class TestCredits:
         assert result == 10
 
         # Verify balance
-        balance = await isolated_storage.get_user_credits(user_id)
+        balance = await memory_storage.get_user_credits(user_id)
         assert balance == 10
 
-    @pytest.mark.asyncio
-    async def test_consume_credit(self, isolated_storage):
+    async def test_consume_credit(self, memory_storage, user_id):
         """Consume credits."""
-        user_id = uuid4()
-
         # Add credits first
-        await isolated_storage.add_credits(user_id, 5, "purchase")
+        await memory_storage.add_credits(user_id, 5, "purchase")
 
         # Consume one
-        result = await isolated_storage.consume_credit(user_id, "Query usage")
+        result = await memory_storage.consume_credit(user_id, "Query usage")
         assert result is True
 
         # Check balance
-        balance = await isolated_storage.get_user_credits(user_id)
+        balance = await memory_storage.get_user_credits(user_id)
         assert balance == 4
 
-    @pytest.mark.asyncio
-    async def test_consume_credit_insufficient(self, isolated_storage):
+    async def test_consume_credit_insufficient(self, memory_storage, user_id):
         """Cannot consume with insufficient credits."""
-        user_id = uuid4()
-
-        result = await isolated_storage.consume_credit(user_id, "Query usage")
+        result = await memory_storage.consume_credit(user_id, "Query usage")
 
         assert result is False
 
-    @pytest.mark.asyncio
-    async def test_get_credit_transactions(self, isolated_storage):
+    async def test_get_credit_transactions(self, memory_storage, user_id):
         """Get transaction history."""
-        user_id = uuid4()
-
-        await isolated_storage.add_credits(user_id, 10, "purchase", "Initial")
-        await isolated_storage.consume_credit(user_id, "Usage 1")
-        await isolated_storage.consume_credit(user_id, "Usage 2")
+        async with memory_storage.batch():
+            await memory_storage.add_credits(user_id, 10, "purchase", "Initial")
+            await memory_storage.consume_credit(user_id, "Usage 1")
+            await memory_storage.consume_credit(user_id, "Usage 2")
 
-        result = await isolated_storage.get_credit_transactions(user_id)
+        result = await memory_storage.get_credit_transactions(user_id)
 
         assert len(result) == 3
         # Verify correct amounts exist (order may vary due to same-second timestamps)
@@ -511,10 +467,9 @@ class TestCredits:
         assert amounts.count(-1) == 2  # Two consumption transactions
         assert amounts.count(10) == 1  # One deposit transaction
 
-    @pytest.mark.asyncio
-    async def test_get_deposit_options(self, isolated_storage):
+    async def test_get_deposit_options(self, memory_storage):
         """Get available deposit options."""
-        result = await isolated_storage.get_deposit_options()
+        result = await memory_storage.get_deposit_options()
 
         assert len(result) == 4
         amounts = [o["amount_cents"] for o in result]
@@ -523,43 +478,280 @@ class TestCredits:
         assert 500 in amounts  # $5
         assert 1000 in amounts  # $10
 
+    async def test_deposit_options_are_independent_copies(self, memory_storage):
+        """Callers get plain dicts; mutating them doesn't change later results."""
+        first = await memory_storage.get_deposit_options()
+        first[0]["amount_cents"] = 1
+        first.pop()
+
+        second = await memory_storage.get_deposit_options()
+        assert isinstance(second, list) and isinstance(second[0], dict)
+        assert [o["amount_cents"] for o in second] == [100, 200, 500, 1000]
+
+    async def test_get_deposit_option(self, memory_storage):
+        """Look up a deposit option by UUID."""
+        option = await memory_storage.get_deposit_option(UUID(int=5))
+
+        assert option["name"] == "$5 Deposit"
+        assert option["amount_cents"] == 500
+        assert await memory_storage.get_deposit_option(UUID(int=20)) is None
+
 
 class TestAccountDeletion:
     """Tests for account deletion."""
 
-    @pytest.mark.asyncio
-    async def test_delete_user_account(self, isolated_storage):
+    async def test_delete_user_account(self, memory_storage):
         """Delete user and all associated data."""
         # Create user with conversations
-        user = await isolated_storage.create_oauth_user(
+        user = await memory_storage.create_oauth_user(
             email="delete@example.com",
             oauth_provider="google",
             oauth_provider_id="google-delete"
         )
-        from uuid import UUID
         user_id = UUID(user["id"])
 
         # Create conversations
-        await isolated_storage.create_conversation("conv-1", user_id=user_id)
-        await isolated_storage.create_conversation("conv-2", user_id=user_id)
+        await memory_storage.bulk_create_conversations([
+            {"conversation_id": "conv-1", "user_id": user_id},
+            {"conversation_id": "conv-2", "user_id": user_id},
+        ])
 
         # Delete account
-        success, key_hash = await isolated_storage.delete_user_account(user_id)
+        success, key_hash = await memory_storage.delete_user_account(user_id)
 
         assert success is True
         assert key_hash is None  # Local storage doesn't have OpenRouter keys
 
         # Verify user is gone
-        found = await isolated_storage.get_user_by_id(user_id)
+        found = await memory_storage.get_user_by_id(user_id)
         assert found is None
 
         # Verify conversations are gone
-        convs = await isolated_storage.list_conversations(user_id=user_id)
+        convs = await memory_storage.list_conversations(user_id=user_id)
         assert len(convs) == 0
 
-    @pytest.mark.asyncio
-    async def test_delete_nonexistent_user(self, isolated_storage):
+    async def test_delete_user_account_removes_credit_files(self, isolated_storage):
+        """No credits file or transaction log is left behind."""
+        user = await isolated_storage.create_oauth_user(
+            email="credits@example.com",
+            oauth_provider="google",
+            oauth_provider_id="google-credits"
+        )
+        user_id = UUID(user["id"])
+        await isolated_storage.add_credits(user_id, 5, "purchase")
+        await isolated_storage.consume_credit(user_id)
+        assert list(isolated_storage.CREDITS_DIR.iterdir())
+
+        await isolated_storage.delete_user_account(user_id)
+
+        assert list(isolated_storage.CREDITS_DIR.iterdir()) == []
+
+    async def test_delete_nonexistent_user(self, memory_storage, uid):
         """Deleting non-existent user returns False."""
-        success, key_hash = await isolated_storage.delete_user_account(uuid4())
+        success, key_hash = await memory_storage.delete_user_account(uid())
 
         assert success is False
+
+
+class TestDiskPersistence:
+    """Tests that go through real JSON files on disk."""
+
+    async def test_conversation_round_trip(self, isolated_storage, uid):
+        """Conversations are written to and read back from JSON files."""
+        conv_id = str(uid())
+        await isolated_storage.create_conversation(conv_id)
+        await isolated_storage.add_user_message(conv_id, "Hello")
+
+        path = isolated_storage.DATA_DIR / f"{conv_id}.json"
+        assert path.exists()
+
+        conv = await isolated_storage.get_conversation(conv_id)
+        assert conv["messages"] == [{"role": "user", "content": "Hello"}]
+        assert [c["id"] for c in await isolated_storage.list_conversations()] == [conv_id]
+
+        assert await isolated_storage.delete_conversation(conv_id) is True
+        assert not path.exists()
+
+    async def test_conversation_index_rebuilt_when_missing(self, isolated_storage, uid):
+        """Listing works for conversation files written before the index existed."""
+        conv_id = str(uid())
+        await isolated_storage.create_conversation(conv_id)
+        await isolated_storage.add_user_message(conv_id, "Hello")
+        index_path = isolated_storage.DATA_DIR / "_index.json"
+        index_path.unlink()
+
+        result = await isolated_storage.list_conversations()
+
+        assert [c["id"] for c in result] == [conv_id]
+        assert result[0]["message_count"] == 1
+        assert index_path.exists()
+
+    async def test_message_append_leaves_index_alone(self, isolated_storage, mocker, uid):
+        """Only the first message changes the index; later appends skip it."""
+        conv_id = str(uid())
+        await isolated_storage.create_conversation(conv_id)
+        index_path = isolated_storage.DATA_DIR / "_index.json"
+        write_file = mocker.spy(isolated_storage, "_write_file")
+
+        await isolated_storage.add_user_message(conv_id, "Hello")
+        assert index_path in [call.args[0] for call in write_file.call_args_list]
+        write_file.reset_mock()
+
+        await isolated_storage.add_assistant_message(conv_id, [], [], {"content": "Hi"})
+        await isolated_storage.add_user_message(conv_id, "Again")
+
+        assert index_path not in [call.args[0] for call in write_file.call_args_list]
+        result = await isolated_storage.list_conversations()
+        assert result[0]["message_count"] == 3
+        assert "\n" not in index_path.read_text()
+
+    async def test_batch_defers_writes(self, isolated_storage, mocker, uid):
+        """Inside batch() reads see pending data; each file is written once on exit."""
+        write_file = mocker.spy(isolated_storage, "_write_file")
+        conv_id = str(uid())
+        path = isolated_storage.DATA_DIR / f"{conv_id}.json"
+
+        async with isolated_storage.batch():
+            await isolated_storage.create_conversation(conv_id)
+            await isolated_storage.add_user_message(conv_id, "Hello")
+            await isolated_storage.update_conversation_title(conv_id, "Batched")
+
+            assert not path.exists()
+            conv = await isolated_storage.get_conversation(conv_id)
+            assert conv["title"] == "Batched"
+            assert len(conv["messages"]) == 1
+
+        # Each file (conversation and index) written exactly once
+        written = [call.args[0] for call in write_file.call_args_list]
+        assert path in written
+        assert len(written) == len(set(written))
+        conv = await isolated_storage.get_conversation(conv_id)
+        assert conv["title"] == "Batched"
+        assert len(conv["messages"]) == 1
+
+    async def test_batch_does_not_leak_into_cached_index(self, isolated_storage, uid):
+        """Index updates inside batch() stay invisible outside it until flushed."""
+        first, second = str(uid()), str(uid())
+        await isolated_storage.create_conversation(first)
+        index_path = isolated_storage.DATA_DIR / "_index.json"
+
+        async with isolated_storage.batch():
+            await isolated_storage.create_conversation(second)
+            # What a reader outside the batch sees (cache or disk)
+            outside = isolated_storage._read_file(index_path, shared=True)
+            assert list(outside) == [first]
+
+        assert list(isolated_storage._read_file(index_path, shared=True)) == [first, second]
+
+    async def test_batch_delete(self, isolated_storage, uid):
+        """Deletes inside batch() are applied on exit."""
+        conv_id = str(uid())
+        await isolated_storage.create_conversation(conv_id)
+
+        async with isolated_storage.batch():
+            assert await isolated_storage.delete_conversation(conv_id) is True
+            assert await isolated_storage.get_conversation(conv_id) is None
+            assert await isolated_storage.delete_conversation(conv_id) is False
+
+        assert not (isolated_storage.DATA_DIR / f"{conv_id}.json").exists()
+
+    async def test_unchanged_file_is_not_reparsed(self, isolated_storage, mocker, uid):
+        """Reading an unchanged file again is served from the document cache."""
+        conv_id = str(uid())
+        await isolated_storage.create_conversation(conv_id)
+        first = await isolated_storage.get_conversation(conv_id)
+        json_load = mocker.spy(isolated_storage.json, "load")
+
+        second = await isolated_storage.get_conversation(conv_id)
+
+        assert json_load.call_count == 0
+        assert first == second
+        assert first is not second
+
+    async def test_write_drops_cached_document(self, isolated_storage, uid):
+        """Writes invalidate the cache entry rather than caching a copy."""
+        conv_id = str(uid())
+        await isolated_storage.create_conversation(conv_id)
+        path = isolated_storage.DATA_DIR / f"{conv_id}.json"
+        await isolated_storage.get_conversation(conv_id)
+        assert path in isolated_storage._doc_cache
+
+        await isolated_storage.update_conversation_title(conv_id, "Renamed")
+
+        assert path not in isolated_storage._doc_cache
+        assert (await isolated_storage.get_conversation(conv_id))["title"] == "Renamed"
+
+    async def test_cached_document_is_not_shared(self, isolated_storage, uid):
+        """Mutating a returned document doesn't leak into later reads."""
+        conv_id = str(uid())
+        await isolated_storage.create_conversation(conv_id)
+
+        conv = await isolated_storage.get_conversation(conv_id)
+        conv["messages"].append({"role": "user", "content": "not saved"})
+
+        assert (await isolated_storage.get_conversation(conv_id))["messages"] == []
+
+    async def test_external_edit_invalidates_cache(self, isolated_storage, uid):
+        """A file changed on disk is re-read instead of served from cache."""
+        conv_id = str(uid())
+        conv = await isolated_storage.create_conversation(conv_id)
+        path = isolated_storage.DATA_DIR / f"{conv_id}.json"
+
+        conv["title"] = "Edited elsewhere"
+        path.write_text(json.dumps(conv))
+
+        assert (await isolated_storage.get_conversation(conv_id))["title"] == "Edited elsewhere"
+
+    async def test_index_lookups_do_not_copy_index(self, isolated_storage, mocker):
+        """Email and OAuth lookups read the cached index without copying it."""
+        user = await isolated_storage.create_oauth_user(
+            email="Indexed@Example.com",
+            oauth_provider="google",
+            oauth_provider_id="google-idx"
+        )
+        deepcopy = mocker.spy(isolated_storage.copy, "deepcopy")
+
+        by_email = await isolated_storage.get_user_by_email("indexed@example.com")
+        by_oauth = await isolated_storage.get_user_by_oauth("google", "google-idx")
+
+        assert by_email["id"] == by_oauth["id"] == user["id"]
+        copied = [call.args[0] for call in deepcopy.call_args_list]
+        assert not any(
+            isinstance(doc, dict) and ("indexed@example.com" in doc or "google:google-idx" in doc)
+            for doc in copied
+        )
+
+    async def test_credit_transactions_are_appended_to_log(self, isolated_storage, user_id):
+        """Transactions go to a JSON Lines log; the credits file holds only balances."""
+        await isolated_storage.add_credits(user_id, 10, "purchase", stripe_session_id="cs_1")
+        await isolated_storage.consume_credit(user_id, "Usage")
+
+        log_path = isolated_storage.CREDITS_DIR / f"{user_id}.transactions.jsonl"
+        assert [json.loads(line)["amount"] for line in log_path.read_text().splitlines()] == [10, -1]
+        credits = json.loads((isolated_storage.CREDITS_DIR / f"{user_id}.json").read_text())
+        assert "transactions" not in credits
+        assert credits["credits"] == 9
+        assert await isolated_storage.was_session_processed("cs_1") is True
+        assert await isolated_storage.was_session_processed("cs_2") is False
+
+    async def test_legacy_credit_transactions_move_to_log(self, isolated_storage, uid):
+        """A transactions list in an old credits file is read, then moved to the log."""
+        user_id = uid()
+        legacy = {
+            "id": str(uid()), "amount": 5, "balance_after": 5, "transaction_type": "purchase",
+            "description": None, "stripe_session_id": "cs_old", "created_at": "2025-01-01T00:00:00",
+        }
+        credits_path = isolated_storage.CREDITS_DIR / f"{user_id}.json"
+        credits_path.write_text(json.dumps(
+            {"credits": 5, "openrouter_total_limit": 0, "transactions": [legacy]}
+        ))
+
+        assert await isolated_storage.was_session_processed("cs_old") is True
+        assert len(await isolated_storage.get_credit_transactions(user_id)) == 1
+
+        await isolated_storage.consume_credit(user_id)
+
+        assert "transactions" not in json.loads(credits_path.read_text())
+        result = await isolated_storage.get_credit_transactions(user_id)
+        assert [t["amount"] for t in result] == [-1, 5]
+        assert await isolated_storage.was_session_processed("cs_old") is True